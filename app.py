@@ -7,46 +7,113 @@ ROI Calculator Web - 投资回报率分析工具
 
 import os
 import sys
+import re
 import time
+import operator
+import hashlib
 import requests
 import json
+import tempfile
+import functools
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+import concurrent.futures
+from requests.adapters import HTTPAdapter, Retry
 from datetime import datetime, timedelta
 from io import BytesIO
-import base64
 import platform
 
+# 脚本目录只解析一次，后续路径都基于它拼接
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # 添加当前目录到路径
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _BASE_DIR)
 
 from roi import ROICalculator
+from cache import cached, cache_stats
 
 from flask import Flask, render_template, request, jsonify
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24)
+# 优先取环境变量，保证多worker间session一致；未配置时退回随机值
+app.secret_key = os.environ.get('SECRET_KEY') or os.urandom(24)
+
+if orjson is not None:
+    from flask.json.provider import JSONProvider
+
+    class OrjsonProvider(JSONProvider):
+        """orjson后端的JSON Provider，jsonify走C层序列化且中文不转义"""
+
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj).decode('utf-8')
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = OrjsonProvider(app)
 
 # 配置
-OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "charts")
+OUTPUT_DIR = os.path.join(_BASE_DIR, "static", "charts")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# HTTP会话：连接池 + keep-alive，跨股票复用TCP/TLS连接，瞬时失败快速重试
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32,
+                       max_retries=Retry(total=2, backoff_factor=0.1))
+session.mount('https://', _adapter)
+session.mount('http://', _adapter)
+# 行情响应只有几百字节，identity省掉gzip编解码往返
+session.headers.update({'User-Agent': 'Mozilla/5.0',
+                        'Accept-Encoding': 'identity'})
+
+# 股票代码格式：SZ/SH + 6位数字（忽略大小写）
+SYMBOL_RE = re.compile(r'^(SZ|SH)(\d{6})$', re.IGNORECASE)
 
+# 图表渲染线程池：让绘图与排序/模板准备并行
+CHART_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+
+@functools.lru_cache(maxsize=256)
+def _to_tencent_code(symbol):
+    """SZ000858 -> sz000858，非法代码返回None（自选股就那几只，缓存免重复正则）"""
+    m = SYMBOL_RE.match(symbol)
+    return m.group(1).lower() + m.group(2) if m else None
+
+
+@functools.lru_cache(maxsize=256)
+def _to_eastmoney_code(symbol):
+    """SZ000858 -> 000858.SZ（东财/akshare的代码格式）"""
+    return symbol[2:] + ('.SH' if symbol.startswith('SH') else '.SZ')
+
+
+@cached('price', ttl=60)
 def get_stock_data_tencent(symbol):
     """获取腾讯股价数据"""
     try:
-        if symbol.startswith('SH'):
-            code = 'sh' + symbol[2:]
-        else:
-            code = 'sz' + symbol[2:]
-        
+        code = _to_tencent_code(symbol)
+        if code is None:
+            print(f"非法股票代码: {symbol}")
+            return None
+
         url = f'https://qt.gtimg.cn/q={code}'
-        response = requests.get(url, timeout=10, headers={
-            'User-Agent': 'Mozilla/5.0'
-        })
+        response = session.get(url, timeout=10)
         
-        parts = response.text.strip().split('~')
+        # 直接处理字节：取引号内负载，按'~'切到第47列即止，
+        # 只解码需要的name字段（腾讯接口为GBK编码）
+        raw = response.content
+        start = raw.find(b'"') + 1
+        end = raw.rfind(b'"')
+        if start <= 0 or end <= start:
+            return None
+
+        parts = raw[start:end].split(b'~', 47)
         if len(parts) > 46:
             return {
-                'name': parts[1],
+                'name': parts[1].decode('gbk', errors='replace'),
                 'price': float(parts[3]) if parts[3] else 0,
                 'pb': float(parts[46]) if parts[46] else 0,
             }
@@ -56,58 +123,100 @@ def get_stock_data_tencent(symbol):
         return None
 
 
+def _fetch_financial_em(em_code):
+    """直连东方财富F10接口取主要财务指标，省掉akshare的全量DataFrame构建"""
+    url = 'https://datacenter.eastmoney.com/securities/api/data/v1/get'
+    params = {
+        'reportName': 'RPT_F10_FINANCE_MAINFINADATA',
+        'columns': 'SECUCODE,REPORT_DATE,REPORT_TYPE,ROEJQ',
+        'filter': f'(SECUCODE="{em_code}")',
+        'pageNumber': 1,
+        'pageSize': 100,
+        'sortTypes': -1,
+        'sortColumns': 'REPORT_DATE',
+        'source': 'HSF10',
+        'client': 'PC',
+    }
+    response = session.get(url, params=params, timeout=10)
+    payload = _loads_json(response.content)
+    return (payload.get('result') or {}).get('data') or []
+
+
+@cached('financial', ttl=24 * 3600)
+def _fetch_financial(symbol):
+    """财务数据（纯网络部分，只有成功结果进缓存）"""
+    akshare_code = _to_eastmoney_code(symbol)
+
+    # 优先直连东财接口，只解析需要的年报ROE字段
+    try:
+        rows = _fetch_financial_em(akshare_code)
+        if rows:
+            for row in rows:
+                if '年报' in (row.get('REPORT_TYPE') or ''):
+                    roe = float(row.get('ROEJQ') or 0)
+                    return {'roe': roe}
+            return {'roe': 0}
+    except Exception as e:
+        print(f"直连东财接口失败，回退akshare: {e}")
+
+    # 回退akshare；此处异常向上抛，由外层兜底，避免把失败缓存成roe=0
+    import akshare as ak
+
+    df = ak.stock_financial_analysis_indicator_em(symbol=akshare_code)
+
+    if len(df) > 0:
+        annual_df = df[df['REPORT_TYPE'].str.contains('年报', na=False, regex=False)]
+        if len(annual_df) > 0:
+            latest = annual_df.iloc[0]
+            roe = float(latest.get('ROEJQ', 0)) if latest.get('ROEJQ') else 0
+            return {'roe': roe}
+    return {'roe': 0}
+
+
 def get_financial_data(symbol):
-    """获取财务数据"""
+    """获取财务数据（失败结果不进缓存，下次请求重试）"""
     try:
-        import akshare as ak
-        
-        if symbol.startswith('SH'):
-            akshare_code = symbol[2:] + ".SH"
-        else:
-            akshare_code = symbol[2:] + ".SZ"
-        
-        df = ak.stock_financial_analysis_indicator_em(symbol=akshare_code)
-        
-        if len(df) > 0:
-            annual_df = df[df['REPORT_TYPE'].str.contains('年报', na=False)]
-            if len(annual_df) > 0:
-                latest = annual_df.iloc[0]
-                roe = float(latest.get('ROEJQ', 0)) if latest.get('ROEJQ') else 0
-                return {'roe': roe}
-        return {'roe': 0}
+        return _fetch_financial(symbol)
     except Exception as e:
         print(f"获取财务数据失败: {e}")
         return {'roe': 0}
 
 
+@cached('ttm_dividend', ttl=6 * 3600)
+def _fetch_ttm_dividend(symbol):
+    """雪球TTM股息（纯网络部分，只有成功结果进缓存）"""
+    import akshare as ak
+
+    df = ak.stock_individual_spot_xq(symbol=symbol)
+    data = dict(zip(df['item'], df['value']))
+
+    ttm_dividend = 0
+    ttm_yield = 0
+
+    for item, value in data.items():
+        if '股息(TTM)' in item:
+            ttm_dividend = float(value) if value else 0
+        elif '股息率(TTM)' in item:
+            ttm_yield = float(value) if value else 0
+
+    return {
+        'ttm_dividend': round(ttm_dividend, 4),
+        'ttm_yield': round(ttm_yield, 4),
+    }
+
+
 def get_ttm_dividend(symbol):
-    """获取TTM股息数据"""
+    """获取TTM股息数据（失败结果不进缓存，下次请求重试）"""
     try:
-        import akshare as ak
-        
-        df = ak.stock_individual_spot_xq(symbol=symbol)
-        data = dict(zip(df['item'], df['value']))
-        
-        ttm_dividend = 0
-        ttm_yield = 0
-        
-        for item, value in data.items():
-            if '股息(TTM)' in item:
-                ttm_dividend = float(value) if value else 0
-            elif '股息率(TTM)' in item:
-                ttm_yield = float(value) if value else 0
-        
-        return {
-            'ttm_dividend': round(ttm_dividend, 4),
-            'ttm_yield': round(ttm_yield, 4),
-        }
+        return _fetch_ttm_dividend(symbol)
     except Exception as e:
         print(f"获取TTM股息失败: {e}")
         return {'ttm_dividend': 0, 'ttm_yield': 0}
 
 
+@functools.lru_cache(maxsize=1)
 def get_chinese_font_path():
-    """获取中文字体路径，下载到本地"""
+    """获取中文字体路径，下载到本地（进程内只探测一次）"""
     font_path = '/tmp/chinese_font.ttc'
     
     if not os.path.exists(font_path) or os.path.getsize(font_path) < 100000:
@@ -133,11 +242,23 @@ def get_chinese_font_path():
     return font_path if os.path.exists(font_path) else None
 
 
-def setup_chinese_font():
-    """设置中文字体，返回font_prop"""
+@functools.lru_cache(maxsize=1)
+def _get_pyplot():
+    """惰性导入matplotlib，Agg后端只设置一次"""
     import matplotlib
     matplotlib.use('Agg')
     import matplotlib.pyplot as plt
+    # 渲染参数：分块处理长路径并开启路径简化，降低Agg光栅化开销
+    plt.rcParams['agg.path.chunksize'] = 10000
+    plt.rcParams['path.simplify'] = True
+    plt.rcParams['path.simplify_threshold'] = 1.0
+    return plt
+
+
+@functools.lru_cache(maxsize=1)
+def setup_chinese_font():
+    """设置中文字体，返回font_prop（进程内只探测一次）"""
+    plt = _get_pyplot()
     import matplotlib.font_manager as fm
     
     system = platform.system()
@@ -161,16 +282,6 @@ def setup_chinese_font():
                 plt.rcParams['font.sans-serif'] = [font_name]
                 plt.rcParams['axes.unicode_minus'] = False
                 print(f"使用字体: {font_name}")
-                
-                # 清除matplotlib缓存
-                import shutil
-                cache_dir = os.path.expanduser('~/.cache/matplotlib')
-                if os.path.exists(cache_dir):
-                    try:
-                        shutil.rmtree(cache_dir)
-                        print("已清除matplotlib字体缓存")
-                    except Exception as e:
-                        print(f"清除缓存失败: {e}")
             except Exception as e:
                 print(f"字体注册失败: {e}")
                 import traceback
@@ -179,103 +290,190 @@ def setup_chinese_font():
     return font_prop
 
 
+# 复用的Figure：图表构建开销在worker内摊销，绘制时加锁防止并发请求互踩
+_chart_lock = threading.Lock()
+_chart_fig = None
+_chart_axes = None
+
+
+def _get_chart_figure():
+    """获取（首次创建）复用的2x2图表Figure"""
+    global _chart_fig, _chart_axes
+    if _chart_fig is None:
+        _chart_fig, _chart_axes = _get_pyplot().subplots(2, 2, figsize=(14, 12))
+    return _chart_fig, _chart_axes
+
+
+def _current_time():
+    """当前展示时间（Linux服务器默认UTC，需要加8小时）"""
+    if platform.system() == 'Windows':
+        return datetime.now()
+    return datetime.now() + timedelta(hours=8)
+
+
+# 秒级缓存的时间戳字符串：同一秒内的请求不重复strftime
+_ts_cache = [0, '']
+
+
+def _fast_timestamp():
+    """返回'%Y-%m-%d %H:%M:%S'格式的当前时间（北京时间），按秒缓存"""
+    now = int(time.time())
+    if _ts_cache[0] != now:
+        _ts_cache[1] = _current_time().strftime('%Y-%m-%d %H:%M:%S')
+        _ts_cache[0] = now
+    return _ts_cache[1]
+
+
+# 输入指纹 -> 已渲染文件名：相同结果集（同一分钟）直接复用，跳过matplotlib。
+# key里带分钟戳，旧条目不会再命中；超过上限整体清空，常驻worker不缓慢泄漏
+_chart_memo = {}
+_CHART_MEMO_MAX = 32
+
+
 def generate_chart(results):
     """生成分析图表"""
-    import matplotlib
-    matplotlib.use('Agg')
-    import matplotlib.pyplot as plt
-    import matplotlib.font_manager as fm
-    
+    stamp = _current_time().strftime('%Y-%m-%d %H:%M')
+    key = hashlib.md5(
+        (stamp + json.dumps(results, sort_keys=True, default=str)).encode()
+    ).hexdigest()
+
+    filename = _chart_memo.get(key)
+    if filename and os.path.exists(f'{OUTPUT_DIR}/{filename}'):
+        return filename
+
+    with _chart_lock:
+        filename = _generate_chart_locked(results, stamp)
+    if len(_chart_memo) >= _CHART_MEMO_MAX:
+        _chart_memo.clear()
+    _chart_memo[key] = filename
+    return filename
+
+
+def _draw_bar_panel(ax, names, values, title, ylabel, fmt, font_prop, colors,
+                    scale_ylim=False):
+    """绘制单个柱状图面板（四个面板共用同一套绘制逻辑）"""
+    bars = ax.bar(names, values, color=colors[:len(names)])
+    ax.set_title(title, fontsize=12, fontweight='bold')
+    ax.set_ylabel(ylabel)
+    if scale_ylim:
+        ax.set_ylim(0, max(values) * 1.3 if values else 10)
+    if font_prop:
+        ax.set_xticks(range(len(names)))
+        ax.set_xticklabels(names, fontproperties=font_prop)
+    ax.bar_label(bars, labels=[fmt.format(v) for v in values],
+                 padding=3, fontsize=10)
+
+
+def _generate_chart_locked(results, stamp):
+    """在持有_chart_lock的前提下绘制并保存图表"""
     font_prop = setup_chinese_font()
-    
-    names = [r['name'] for r in results]
-    f1_values = [r['roi_formula1'] for r in results]
-    f2_values = [r['roi_formula2'] for r in results]
-    roes = [r['roe'] for r in results]
-    prices = [r['price'] for r in results]
+
+    # 一次遍历把结果转成SoA列，避免四次独立的列表推导
+    names, f1_values, f2_values, roes, prices = zip(
+        *((r['name'], r['roi_formula1'], r['roi_formula2'], r['roe'], r['price'])
+          for r in results))
     
     colors = ['#4472C4', '#ED7D31', '#70AD47', '#FFC000', '#9BBB59']
     
-    fig, axes = plt.subplots(2, 2, figsize=(14, 12))
-    
-    # 根据系统设置时间
-    system = platform.system()
-    if system == 'Windows':
-        current_time = datetime.now()
-    else:
-        # Linux服务器默认UTC时间，需要加8小时
-        current_time = datetime.now() + timedelta(hours=8)
-    fig.suptitle(f'ROI Analysis - {current_time.strftime("%Y-%m-%d %H:%M")}', 
-                 fontsize=16, fontweight='bold')
+    fig, axes = _get_chart_figure()
+    for ax in axes.flat:
+        ax.clear()
+
+    fig.suptitle(f'ROI Analysis - {stamp}', fontsize=16, fontweight='bold')
     
     # 股息率
-    ax1 = axes[0, 0]
-    bars1 = ax1.bar(names, f1_values, color=colors[:len(names)])
-    ax1.set_title('ROI Formula 1: Dividend Yield (%)', fontsize=12, fontweight='bold')
-    ax1.set_ylabel('Yield (%)')
-    ax1.set_ylim(0, max(f1_values) * 1.3 if f1_values else 10)
-    if font_prop:
-        ax1.set_xticks(range(len(names)))
-        ax1.set_xticklabels(names, fontproperties=font_prop)
-    for bar, val in zip(bars1, f1_values):
-        ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, 
-                f'{val:.2f}%', ha='center', va='bottom', fontsize=10)
-    
+    _draw_bar_panel(axes[0, 0], names, f1_values, 'ROI Formula 1: Dividend Yield (%)',
+                    'Yield (%)', '{:.2f}%', font_prop, colors, scale_ylim=True)
     # ROE/PB
-    ax2 = axes[0, 1]
-    bars2 = ax2.bar(names, f2_values, color=colors[:len(names)])
-    ax2.set_title('ROI Formula 2: ROE/PB (%)', fontsize=12, fontweight='bold')
-    ax2.set_ylabel('ROE/PB (%)')
-    ax2.set_ylim(0, max(f2_values) * 1.3 if f2_values else 10)
-    if font_prop:
-        ax2.set_xticks(range(len(names)))
-        ax2.set_xticklabels(names, fontproperties=font_prop)
-    for bar, val in zip(bars2, f2_values):
-        ax2.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, 
-                f'{val:.2f}%', ha='center', va='bottom', fontsize=10)
-    
+    _draw_bar_panel(axes[0, 1], names, f2_values, 'ROI Formula 2: ROE/PB (%)',
+                    'ROE/PB (%)', '{:.2f}%', font_prop, colors, scale_ylim=True)
     # ROE
-    ax3 = axes[1, 0]
-    bars3 = ax3.bar(names, roes, color=colors[:len(names)])
-    ax3.set_title('ROE (%)', fontsize=12, fontweight='bold')
-    ax3.set_ylabel('ROE (%)')
-    if font_prop:
-        ax3.set_xticks(range(len(names)))
-        ax3.set_xticklabels(names, fontproperties=font_prop)
-    for bar, val in zip(bars3, roes):
-        ax3.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.5, 
-                f'{val:.2f}%', ha='center', va='bottom', fontsize=10)
-    
+    _draw_bar_panel(axes[1, 0], names, roes, 'ROE (%)',
+                    'ROE (%)', '{:.2f}%', font_prop, colors)
     # Price
-    ax4 = axes[1, 1]
-    bars4 = ax4.bar(names, prices, color=colors[:len(names)])
-    ax4.set_title('Price (yuan)', fontsize=12, fontweight='bold')
-    ax4.set_ylabel('Price (yuan)')
-    if font_prop:
-        ax4.set_xticks(range(len(names)))
-        ax4.set_xticklabels(names, fontproperties=font_prop)
-    for bar, val in zip(bars4, prices):
-        ax4.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 5, 
-                f'{val:.2f}', ha='center', va='bottom', fontsize=10)
-    
-    plt.tight_layout()
-    
-    timestamp = current_time.strftime('%Y%m%d_%H%M%S')
-    filename = f'chart_{timestamp}.png'
-    filepath = os.path.join(OUTPUT_DIR, filename)
-    plt.savefig(filepath, dpi=150, bbox_inches='tight')
-    plt.close()
-    
+    _draw_bar_panel(axes[1, 1], names, prices, 'Price (yuan)',
+                    'Price (yuan)', '{:.2f}', font_prop, colors)
+
+    fig.tight_layout()
+
+    # 渲染到内存并按内容哈希命名：相同结果集复用同一文件，浏览器可长期缓存
+    # 96DPI对~700px宽的页面展示足够；不用bbox_inches='tight'省掉第二次渲染
+    # 优先WebP（体积小、编码快），Pillow不支持时回退PNG
+    buf = BytesIO()
+    try:
+        fig.savefig(buf, format='webp', dpi=96)
+        ext = 'webp'
+    except Exception:
+        buf = BytesIO()
+        # 低压缩级别：dashboard图表不值得为几十KB多花zlib时间
+        fig.savefig(buf, format='png', dpi=96,
+                    pil_kwargs={'optimize': False, 'compress_level': 1})
+        ext = 'png'
+    digest = hashlib.blake2b(buf.getbuffer(), digest_size=8).hexdigest()
+    filename = f'chart_{digest}.{ext}'
+    filepath = f'{OUTPUT_DIR}/{filename}'
+    if not os.path.exists(filepath):
+        with open(filepath, 'wb') as f:
+            f.write(buf.getbuffer())
+        # 新文件落盘后在后台清理旧图，不占用请求路径
+        CHART_EXECUTOR.submit(_evict_old_charts)
+
     return filename
 
 
+def _evict_old_charts(keep=50):
+    """只保留最近keep张图表，防止按内容哈希命名的文件无限堆积"""
+    try:
+        charts = [e for e in os.scandir(OUTPUT_DIR)
+                  if e.name.startswith('chart_')]
+        if len(charts) <= keep:
+            return
+        charts.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in charts[keep:]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    except Exception as e:
+        print(f"清理旧图表失败: {e}")
+
+
 # ==================== 辅助函数 ====================
 
+# 配置文件缓存：path -> (mtime_ns, 解析结果)，文件未变则不重复读盘
+_config_cache = {}
+
+
+def _loads_json(data):
+    """反序列化JSON字节串，优先使用orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps_json(obj):
+    """序列化为带缩进的JSON字节串，优先使用orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def _load_json_config(path):
+    """读取JSON配置，按mtime缓存"""
+    mtime = os.stat(path).st_mtime_ns
+    entry = _config_cache.get(path)
+    if entry and entry[0] == mtime:
+        return entry[1]
+    with open(path, 'rb') as f:
+        value = _loads_json(f.read())
+    _config_cache[path] = (mtime, value)
+    return value
+
+
 def get_stocks():
     """读取股票配置"""
     try:
-        with open('stocks.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return _load_json_config('stocks.json')
     except:
         return [
             {"name": "东阿阿胶", "symbol": "SZ000423"},
@@ -285,105 +483,181 @@ def get_stocks():
         ]
 
 
+def atomic_write(path, data):
+    """写临时文件后原子rename，避免并发写/断电损坏配置文件"""
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.tmp_')
+    try:
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp, path)
+
+
 def save_stocks(stocks):
     """保存股票配置"""
-    with open('stocks.json', 'w', encoding='utf-8') as f:
-        json.dump(stocks, f, ensure_ascii=False, indent=2)
+    atomic_write('stocks.json', _dumps_json(stocks))
 
 
 def get_rules():
     """读取规则配置"""
     try:
-        with open('rules.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return _load_json_config('rules.json')
     except:
         return []
 
 
 def save_rules(rules):
     """保存规则配置"""
-    with open('rules.json', 'w', encoding='utf-8') as f:
-        json.dump(rules, f, ensure_ascii=False, indent=2)
-
-
-def apply_custom_roe(roe, symbol, rules):
-    """应用自定义ROE规则"""
-    for rule in rules:
-        if rule['symbol'] == symbol:
-            min_roe = float(rule['min_roe'])
-            if roe < min_roe:
-                print(f"应用规则: {symbol} ROE {roe}% < {min_roe}%, 使用 {min_roe}%")
-                return min_roe
+    atomic_write('rules.json', _dumps_json(rules))
+
+
+def fetch_stock_bundle(symbol):
+    """并发获取单只股票的行情/财务/TTM股息数据"""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as pool:
+        f_data = pool.submit(get_stock_data_tencent, symbol)
+        f_fin = pool.submit(get_financial_data, symbol)
+        f_ttm = pool.submit(get_ttm_dividend, symbol)
+        return f_data.result(), f_fin.result(), f_ttm.result()
+
+
+def fetch_all_stocks(symbols):
+    """线程池并发抓取全部股票数据，网络等待相互重叠"""
+    if not symbols:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(16, len(symbols))) as pool:
+        bundles = list(pool.map(fetch_stock_bundle, symbols))
+    stats = cache_stats()
+    print(f"缓存统计: hit={stats['hit']} miss={stats['miss']}")
+    return bundles
+
+
+def apply_custom_roe(roe, symbol, rules_map):
+    """应用自定义ROE规则（rules_map: {symbol: min_roe}）"""
+    min_roe = rules_map.get(symbol)
+    if min_roe is not None and roe < min_roe:
+        print(f"应用规则: {symbol} ROE {roe}% < {min_roe}%, 使用 {min_roe}%")
+        return min_roe
     return roe
 
 
-# ==================== 路由 ====================
+# 预绑定的多键提取器：单次C层取值代替逐键下标
+_EXTRACT_TENCENT = operator.itemgetter('name', 'price', 'pb')
+_EXTRACT_TTM = operator.itemgetter('ttm_dividend', 'ttm_yield')
 
-@app.route('/')
-def index():
-    """首页"""
-    return render_template('index.html', stocks=get_stocks(), rules=get_rules())
 
+# 计算器无内部状态，进程内共享一个实例
+_CALCULATOR = ROICalculator()
 
-@app.route('/query', methods=['POST'])
-def query():
-    """查询股票ROI"""
-    symbols = request.form.getlist('symbols')
-    
-    config_stocks = get_stocks()
-    rules = get_rules()
-    
-    if not symbols:
-        symbols = [s['symbol'] for s in config_stocks]
-    
+
+def collect_results(symbols):
+    """并发抓取一组股票数据并计算ROI，返回结果字典列表"""
+    # 规则列表转字典，符号查找O(1)
+    rules_map = {rule['symbol']: float(rule['min_roe']) for rule in get_rules()}
     results = []
-    calculator = ROICalculator()
-    
-    for symbol in symbols:
-        data = get_stock_data_tencent(symbol)
+
+    for symbol, (data, fin_data, ttm_data) in zip(symbols, fetch_all_stocks(symbols)):
         if not data:
             continue
-        
-        fin_data = get_financial_data(symbol)
-        ttm_data = get_ttm_dividend(symbol)
-        
-        price = data['price']
+
+        name, price, pb = _EXTRACT_TENCENT(data)
         roe = fin_data['roe']
-        pb = data['pb']
-        ttm_yield = ttm_data['ttm_yield']
-        ttm_dividend = ttm_data['ttm_dividend']
-        
+        ttm_dividend, ttm_yield = _EXTRACT_TTM(ttm_data)
+
         # 应用自定义ROE规则
         original_roe = roe
-        roe = apply_custom_roe(roe, symbol, rules)
-        
+        roe = apply_custom_roe(roe, symbol, rules_map)
+
         stock_info = {
-            'name': data['name'],
+            'name': name,
             'symbol': symbol,
             'current_price': price,
             'financial': {'roe': roe, 'pb': pb},
             'dividend_yield': ttm_yield,
             'dividend': {'dividends': [{'cash_div': ttm_dividend}]}
         }
-        
-        result = calculator.calculate(stock_info)
-        
+
+        result = _CALCULATOR.calculate(stock_info)
+
         results.append({
-            'name': data['name'],
+            'name': name,
             'symbol': symbol,
             'price': price,
             'roe': roe,
             'original_roe': original_roe,
             'pb': pb,
             'dividend': ttm_dividend,
+            'dividend_yield': ttm_yield,
             'roi_formula1': result.roi_formula1,
             'roi_formula2': result.roi_formula2,
         })
-    
+
+    return results
+
+
+def _warmup():
+    """后台预热重量级依赖，首个请求不再付出导入/字体探测代价"""
+    try:
+        import akshare  # noqa: F401
+    except Exception as e:
+        print(f"akshare预热失败: {e}")
+    try:
+        setup_chinese_font()
+    except Exception as e:
+        print(f"字体预热失败: {e}")
+    try:
+        # 空渲染一次，填充matplotlib内部缓存，首个真实图表不付初始化成本
+        with _chart_lock:
+            fig, _ = _get_chart_figure()
+            fig.savefig(BytesIO(), format='png', dpi=96)
+    except Exception as e:
+        print(f"图表预热失败: {e}")
+
+
+# Werkzeug reloader的父进程不提供服务，跳过预热避免双重执行
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    threading.Thread(target=_warmup, daemon=True).start()
+
+
+# ==================== 路由 ====================
+
+@app.after_request
+def add_chart_cache_headers(response):
+    """图表文件名即内容哈希，可以安全地长期缓存"""
+    if request.path.startswith('/static/charts/'):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.route('/')
+def index():
+    """首页"""
+    return render_template('index.html', stocks=get_stocks(), rules=get_rules())
+
+
+@app.route('/query', methods=['POST'])
+def query():
+    """查询股票ROI"""
+    symbols = request.form.getlist('symbols')
+
+    if not symbols:
+        symbols = [s['symbol'] for s in get_stocks()]
+
+    results = collect_results(symbols)
+
     if results:
-        chart_file = generate_chart(results)
-        sorted_by_f1 = sorted(results, key=lambda x: x['roi_formula1'], reverse=True)
-        sorted_by_f2 = sorted(results, key=lambda x: x['roi_formula2'], reverse=True)
+        import numpy as np
+
+        # 图表在后台线程渲染，与排序并行，返回前join
+        chart_future = CHART_EXECUTOR.submit(generate_chart, results)
+
+        # 排序交给numpy：一次materialize两列，argsort在C层完成比较
+        f1 = np.fromiter((r['roi_formula1'] for r in results), dtype=np.float64)
+        f2 = np.fromiter((r['roi_formula2'] for r in results), dtype=np.float64)
+        sorted_by_f1 = [results[i] for i in np.argsort(-f1, kind='stable')]
+        sorted_by_f2 = [results[i] for i in np.argsort(-f2, kind='stable')]
+
+        chart_file = chart_future.result()
         
         return render_template('result.html', 
                              results=results,
@@ -403,15 +677,15 @@ def add_stock():
     if not name or not symbol:
         return render_template('index.html', stocks=get_stocks(), rules=get_rules(), message="请填写股票名称和代码")
     
-    if not symbol.startswith(('SZ', 'SH')):
-        return render_template('index.html', stocks=get_stocks(), rules=get_rules(), message="股票代码必须以 SZ 或 SH 开头")
-    
+    if not SYMBOL_RE.match(symbol):
+        return render_template('index.html', stocks=get_stocks(), rules=get_rules(), message="股票代码格式应为 SZ/SH + 6位数字")
+
     stocks = get_stocks()
-    
-    for s in stocks:
-        if s['symbol'] == symbol:
-            return render_template('index.html', stocks=stocks, rules=get_rules(), message=f"股票 {symbol} 已存在")
-    
+
+    # 按代码建索引做O(1)查重（磁盘上仍保持列表格式）
+    if symbol in {s['symbol'] for s in stocks}:
+        return render_template('index.html', stocks=stocks, rules=get_rules(), message=f"股票 {symbol} 已存在")
+
     stocks.append({'name': name, 'symbol': symbol})
     save_stocks(stocks)
     
@@ -427,15 +701,14 @@ def delete_stock():
         return render_template('index.html', stocks=get_stocks(), rules=get_rules(), message="股票代码不能为空")
     
     stocks = get_stocks()
-    
-    for i, s in enumerate(stocks):
-        if s['symbol'] == symbol:
-            name = s['name']
-            del stocks[i]
-            save_stocks(stocks)
-            return render_template('index.html', stocks=stocks, rules=get_rules(), message=f"已删除 {name} ({symbol})")
-    
-    return render_template('index.html', stocks=get_stocks(), rules=get_rules(), message=f"股票 {symbol} 不存在")
+
+    name = {s['symbol']: s['name'] for s in stocks}.get(symbol)
+    if name is None:
+        return render_template('index.html', stocks=stocks, rules=get_rules(), message=f"股票 {symbol} 不存在")
+
+    stocks = [s for s in stocks if s['symbol'] != symbol]
+    save_stocks(stocks)
+    return render_template('index.html', stocks=stocks, rules=get_rules(), message=f"已删除 {name} ({symbol})")
 
 
 @app.route('/add_rule', methods=['POST'])
@@ -447,22 +720,22 @@ def add_rule():
     if not symbol or not min_roe:
         return render_template('index.html', stocks=get_stocks(), rules=get_rules(), message="请填写股票代码和最低ROE")
     
-    if not symbol.startswith(('SZ', 'SH')):
-        return render_template('index.html', stocks=get_stocks(), rules=get_rules(), message="股票代码必须以 SZ 或 SH 开头")
-    
+    if not SYMBOL_RE.match(symbol):
+        return render_template('index.html', stocks=get_stocks(), rules=get_rules(), message="股票代码格式应为 SZ/SH + 6位数字")
+
     try:
         min_roe = float(min_roe)
     except:
         return render_template('index.html', stocks=get_stocks(), rules=get_rules(), message="最低ROE必须为数字")
     
     rules = get_rules()
-    
-    for rule in rules:
-        if rule['symbol'] == symbol:
-            rule['min_roe'] = min_roe
-            save_rules(rules)
-            return render_template('index.html', stocks=get_stocks(), rules=rules, message=f"已更新 {symbol} 最低ROE为 {min_roe}%")
-    
+
+    existing = {r['symbol']: r for r in rules}.get(symbol)
+    if existing is not None:
+        existing['min_roe'] = min_roe
+        save_rules(rules)
+        return render_template('index.html', stocks=get_stocks(), rules=rules, message=f"已更新 {symbol} 最低ROE为 {min_roe}%")
+
     rules.append({'symbol': symbol, 'min_roe': min_roe})
     save_rules(rules)
     
@@ -478,14 +751,13 @@ def delete_rule():
         return render_template('index.html', stocks=get_stocks(), rules=get_rules(), message="股票代码不能为空")
     
     rules = get_rules()
-    
-    for i, rule in enumerate(rules):
-        if rule['symbol'] == symbol:
-            del rules[i]
-            save_rules(rules)
-            return render_template('index.html', stocks=get_stocks(), rules=rules, message=f"已删除 {symbol} 的ROE规则")
-    
-    return render_template('index.html', stocks=get_stocks(), rules=get_rules(), message=f"规则 {symbol} 不存在")
+
+    if symbol not in {r['symbol'] for r in rules}:
+        return render_template('index.html', stocks=get_stocks(), rules=rules, message=f"规则 {symbol} 不存在")
+
+    rules = [r for r in rules if r['symbol'] != symbol]
+    save_rules(rules)
+    return render_template('index.html', stocks=get_stocks(), rules=rules, message=f"已删除 {symbol} 的ROE规则")
 
 
 @app.route('/api/query', methods=['POST'])
@@ -497,70 +769,50 @@ def api_query():
         
         if not symbols:
             return jsonify({'error': '请提供股票代码列表'})
-        
-        results = []
-        calculator = ROICalculator()
-        rules = get_rules()
-        
-        for symbol in symbols:
-            stock_data = get_stock_data_tencent(symbol)
-            if not stock_data:
-                continue
-            
-            fin_data = get_financial_data(symbol)
-            ttm_data = get_ttm_dividend(symbol)
-            
-            price = stock_data['price']
-            roe = fin_data['roe']
-            pb = stock_data['pb']
-            ttm_yield = ttm_data['ttm_yield']
-            ttm_dividend = ttm_data['ttm_dividend']
-            
-            roe = apply_custom_roe(roe, symbol, rules)
-            
-            stock_info = {
-                'name': stock_data['name'],
-                'symbol': symbol,
-                'current_price': price,
-                'financial': {'roe': roe, 'pb': pb},
-                'dividend_yield': ttm_yield,
-                'dividend': {'dividends': [{'cash_div': ttm_dividend}]}
-            }
-            
-            result = calculator.calculate(stock_info)
-            
-            results.append({
-                'name': stock_data['name'],
-                'symbol': symbol,
-                'price': price,
-                'roe': roe,
-                'pb': pb,
-                'dividend': ttm_dividend,
-                'dividend_yield': ttm_yield,
-                'roi_formula1': result.roi_formula1,
-                'roi_formula2': result.roi_formula2,
-            })
-        
-        system = platform.system()
-        if system == 'Windows':
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        else:
-            timestamp = (datetime.now() + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S')
-        
+
+        results = collect_results(symbols)
+
         return jsonify({
             'success': True,
             'results': results,
-            'timestamp': timestamp
+            'timestamp': _fast_timestamp()
         })
     
     except Exception as e:
         return jsonify({'error': str(e)})
 
 
+@app.route('/api/chart_data', methods=['POST'])
+def api_chart_data():
+    """图表数据接口：返回纯数值数组，供前端（Chart.js等）直接渲染"""
+    try:
+        data = request.json
+        symbols = data.get('symbols', [])
+
+        if not symbols:
+            symbols = [s['symbol'] for s in get_stocks()]
+
+        results = collect_results(symbols)
+
+        return jsonify({
+            'success': True,
+            'names': [r['name'] for r in results],
+            'f1': [r['roi_formula1'] for r in results],
+            'f2': [r['roi_formula2'] for r in results],
+            'roes': [r['roe'] for r in results],
+            'prices': [r['price'] for r in results],
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+
 if __name__ == '__main__':
     print("=" * 60)
     print(f"  ROI Calculator - Web Version")
     print(f"  系统: {platform.system()}")
     print(f"  访问: http://localhost:5000")
     print("=" * 60)
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # 生产环境用gunicorn（见gunicorn.conf.py）；debug仅在显式开启时生效
+    app.run(host='0.0.0.0', port=5000,
+            debug=os.environ.get('FLASK_DEBUG') == '1')
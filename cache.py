@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件缓存 - 缓存上游行情/财务数据，避免重复网络请求
+缓存文件: .cache/{symbol}/{endpoint}.json
+格式: {"ts": 写入时间戳, "ttl": 有效期秒数, "value": 缓存值}
+"""
+
+import os
+import json
+import time
+import hashlib
+import functools
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+# 各endpoint的时间桶宽度（秒）：同一桶内的请求共享一条缓存，
+# 跨桶视为过期。生产环境可直接调整。
+BUCKET_SECONDS = {
+    'price': 60,
+    'price_cli': 120,
+    'financial': 86400,
+    'financial_cli': 86400,
+    'financial_fast': 7 * 86400,
+    'ttm_dividend': 86400,
+    'ttm_fast': 86400,
+}
+
+# 命中/未命中计数（观测用）
+_stats = {'hit': 0, 'miss': 0}
+
+
+class FileCache:
+    """基于JSON文件的TTL缓存"""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        # 进程内一级缓存：热读不碰磁盘，锁保护并发访问
+        self._mem = {}
+        self._lock = threading.Lock()
+
+    def _path(self, symbol, endpoint):
+        # 符号做md5，避免异常字符进文件名。文件名固定、过期原地覆盖：
+        # 磁盘文件数和_mem条目数都封顶在 符号数×endpoint数
+        key = hashlib.md5(symbol.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key, f"{endpoint}.json")
+
+    def get(self, symbol, endpoint):
+        """读取缓存（先查内存，冷启动回退磁盘），过期或不存在返回None"""
+        path = self._path(symbol, endpoint)
+        with self._lock:
+            entry = self._mem.get(path)
+        if entry is None:
+            try:
+                with open(path, 'rb') as f:
+                    raw = f.read()
+                entry = orjson.loads(raw) if orjson is not None else json.loads(raw)
+                with self._lock:
+                    self._mem[path] = entry
+            except Exception:
+                return None
+        now = time.time()
+        if now - entry['ts'] >= entry['ttl']:
+            return None
+        # 时间桶语义放在新鲜度判断里：写入与读取不在同一桶则视为过期，
+        # 同桶请求仍共享一条缓存
+        bucket = BUCKET_SECONDS.get(endpoint)
+        if bucket and int(now // bucket) != int(entry['ts'] // bucket):
+            return None
+        return entry['value']
+
+    def set(self, symbol, endpoint, value, ttl):
+        """写入缓存（内存+磁盘）"""
+        path = self._path(symbol, endpoint)
+        entry = {'ts': time.time(), 'ttl': ttl, 'value': value}
+        with self._lock:
+            self._mem[path] = entry
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if orjson is not None:
+                data = orjson.dumps(entry)
+            else:
+                data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+            with open(path, 'wb') as f:
+                f.write(data)
+        except Exception as e:
+            print(f"缓存写入失败 {symbol}/{endpoint}: {e}")
+
+
+_cache = FileCache()
+
+
+def cached(endpoint, ttl):
+    """TTL缓存装饰器，包装 func(symbol) -> 可JSON序列化的值"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(symbol):
+            value = _cache.get(symbol, endpoint)
+            if value is not None:
+                _stats['hit'] += 1
+                return value
+            _stats['miss'] += 1
+            value = func(symbol)
+            if value is not None:
+                _cache.set(symbol, endpoint, value, ttl)
+            return value
+        return wrapper
+    return decorator
+
+
+def cache_stats():
+    """返回命中/未命中计数"""
+    return dict(_stats)
@@ -0,0 +1,8 @@
+# Gunicorn配置
+# 路由主要阻塞在上游HTTP调用上，用gthread worker让并发请求在线程间重叠等待
+import multiprocessing
+
+workers = multiprocessing.cpu_count() * 2 + 1
+worker_class = 'gthread'
+threads = 8
+timeout = 120
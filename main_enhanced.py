@@ -1,81 +1,156 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-"""
-ROI计算器 - 增强版
-功能：
-1. 支持两种分红统计口径：最近12个月、年度分配
-2. 动态获取分红和财务数据（无需配置）
-3. 备注保底分红信息
-数据来源：
-- 价格: 腾讯实时API
-- ROE/BPS: akshare stock_financial_analysis_indicator_em
-- 分红: akshare stock_fhps_em (2024年度 + 2025中期)
-"""
-
-import sys
-import os
-import time
-import requests
-import logging
-from datetime import datetime
-
-# 设置编码
-if sys.platform == 'win32':
-    import io
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
-
-project_dir = r"D:\code\git\roi_calculator"
-sys.path.insert(0, project_dir)
-os.chdir(project_dir)
-sys.path.insert(0, project_dir)
-
-# 日志配置
-log_dir = os.path.join(project_dir, "data", "log")
-os.makedirs(log_dir, exist_ok=True)
-log_file = os.path.join(log_dir, f"roi_enhanced_{datetime.now().strftime('%Y%m%d')}.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-os.chdir(project_dir)
-
-
-def get_stock_data_tencent(symbol: str) -> dict:
-    """使用腾讯接口获取实时价格数据"""
-    try:
-        if symbol.startswith('SH'):
-            code = 'sh' + symbol[2:]
-        else:
-            code = 'sz' + symbol[2:]
-        
-        url = f'https://qt.gtimg.cn/q={code}'
-        response = requests.get(url, timeout=10, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        
-        text = response.text.strip()
-        parts = text.split('~')
-        
-        if len(parts) > 45:
-            return {
-                'name': parts[1],
-                'price': float(parts[3]) if parts[3] else 0,
-                'pe': float(parts[37]) if parts[37] else 0,
-                'pb': float(parts[38]) if parts[38] else 0,
-                'source': '腾讯'
-            }
-        return None
-    except Exception as e:
-        return None
-
-
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ROI计算器 - 增强版
+功能：
+1. 支持两种分红统计口径：最近12个月、年度分配
+2. 动态获取分红和财务数据（无需配置）
+3. 备注保底分红信息
+数据来源：
+- 价格: 腾讯实时API
+- ROE/BPS: akshare stock_financial_analysis_indicator_em
+- 分红: akshare stock_fhps_em (2024年度 + 2025中期)
+"""
+
+import sys
+import os
+import time
+import requests
+import atexit
+import logging
+import hashlib
+import functools
+import threading
+import concurrent.futures
+from logging.handlers import MemoryHandler
+from datetime import datetime
+
+# 设置编码
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+project_dir = r"D:\code\git\roi_calculator"
+sys.path.insert(0, project_dir)
+os.chdir(project_dir)
+sys.path.insert(0, project_dir)
+
+# 日志配置
+log_dir = os.path.join(project_dir, "data", "log")
+os.makedirs(log_dir, exist_ok=True)
+log_file = os.path.join(log_dir, f"roi_enhanced_{datetime.now().strftime('%Y%m%d')}.log")
+
+# 文件日志走MemoryHandler批量落盘：FileHandler默认每条记录都flush，
+# 汇总表几十行会产生几十次写盘；ERROR及以上仍立即刷出，退出时兜底flush
+_file_handler = logging.FileHandler(log_file, encoding='utf-8')
+# MemoryHandler转交记录时用target自己的formatter，须显式设置，
+# 否则文件里只剩裸消息（basicConfig的format只作用于它直挂的handler）
+_file_handler.setFormatter(
+    logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+_memory_handler = MemoryHandler(capacity=1000, flushLevel=logging.ERROR,
+                                target=_file_handler)
+atexit.register(_memory_handler.close)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        _memory_handler,
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+os.chdir(project_dir)
+
+from cache import cached  # noqa: E402
+from requests.adapters import HTTPAdapter, Retry  # noqa: E402
+
+# 重依赖统一在模块顶层导入：CLI每次运行都会用到，
+# 启动时一次付清初始化成本，热函数里不再反复走import机制
+import akshare as ak  # noqa: E402
+import matplotlib  # noqa: E402
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+from openpyxl import Workbook  # noqa: E402
+from openpyxl.cell import WriteOnlyCell  # noqa: E402
+from openpyxl.styles import Font, Alignment  # noqa: E402
+
+plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']
+plt.rcParams['axes.unicode_minus'] = False
+
+# 共享Session：TCP/TLS握手只做一次，失败自动重试
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16, pool_maxsize=64,
+    max_retries=Retry(total=3, backoff_factor=0.2)))
+_SESSION.headers.update({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+})
+
+
+@cached('price_cli', ttl=120)
+def get_stock_data_tencent(symbol: str) -> dict:
+    """使用腾讯接口获取实时价格数据（2分钟TTL缓存，重跑脚本不重复请求）"""
+    try:
+        if symbol.startswith('SH'):
+            code = 'sh' + symbol[2:]
+        else:
+            code = 'sz' + symbol[2:]
+        
+        url = f'https://qt.gtimg.cn/q={code}'
+        response = _SESSION.get(url, timeout=10)
+        
+        text = response.text.strip()
+        parts = text.split('~')
+        
+        if len(parts) > 45:
+            return {
+                'name': parts[1],
+                'price': float(parts[3]) if parts[3] else 0,
+                'pe': float(parts[37]) if parts[37] else 0,
+                'pb': float(parts[38]) if parts[38] else 0,
+                'source': '腾讯'
+            }
+        return None
+    except Exception as e:
+        return None
+
+
+def get_stock_data_tencent_batch(symbols: list) -> dict:
+    """一次HTTP请求批量获取多只股票的腾讯行情，返回 {symbol: data}
+    腾讯接口支持逗号分隔多代码：q=sh600519,sz000858,...
+    解析失败/缺失的代码不会出现在返回值里，由调用方回退单只请求"""
+    result = {}
+    try:
+        code_map = {('sh' if s.startswith('SH') else 'sz') + s[2:]: s
+                    for s in symbols}
+        url = 'https://qt.gtimg.cn/q=' + ','.join(code_map)
+        response = _SESSION.get(url, timeout=10)
+
+        # 响应按';'分行，每行形如 v_sz000423="51~东阿阿胶~..."
+        for line in response.text.strip().split(';'):
+            line = line.strip()
+            if '=' not in line:
+                continue
+            var, _, payload = line.partition('=')
+            symbol = code_map.get(var.strip()[2:])
+            if symbol is None:
+                continue
+            parts = payload.strip('"').split('~')
+            if len(parts) > 45:
+                result[symbol] = {
+                    'name': parts[1],
+                    'price': float(parts[3]) if parts[3] else 0,
+                    'pe': float(parts[37]) if parts[37] else 0,
+                    'pb': float(parts[38]) if parts[38] else 0,
+                    'source': '腾讯'
+                }
+    except Exception:
+        pass
+    return result
+
+
 def get_custom_roe(symbol: str) -> float:
     """获取自定义ROE配置"""
     try:
@@ -85,68 +160,113 @@ def get_custom_roe(symbol: str) -> float:
         return None
 
 
-def get_financial_data_akshare(symbol: str) -> dict:
-    """
-    从akshare获取财务数据 (ROE, BPS)
-    优先级：自定义ROE > 年度ROE(从年报数据中获取ROEJQ)
-    """
+def _scalar(df, idx, col, default=0.0):
+    """用df.at取单个标量，绕过iloc[0].get的整行Series物化；NaN/缺列回退default"""
+    try:
+        val = df.at[idx, col]
+        if val is None or val != val:
+            return default
+        return val
+    except Exception:
+        return default
+
+
+@cached('financial_cli', ttl=86400)
+def _fetch_financial_akshare(symbol: str) -> dict:
+    """下载并解析akshare财务指标（年度ROE约一季度才更新，落盘缓存一天，
+    当天重跑脚本跳过整个akshare抓取+解析流程）"""
     try:
-        import akshare as ak
-        
         if symbol.startswith('SH'):
             akshare_code = symbol[2:] + ".SH"
         else:
             akshare_code = symbol[2:] + ".SZ"
-        
+
         df = ak.stock_financial_analysis_indicator_em(symbol=akshare_code)
-        
-        if len(df) > 0:
-            # 1. 优先使用自定义ROE
-            custom_roe = get_custom_roe(symbol)
-            if custom_roe is not None:
-                bps = float(df.iloc[0].get('BPS', 0)) if df.iloc[0].get('BPS') else 0
-                report_date = str(df.iloc[0].get('REPORT_DATE', '')) if df.iloc[0].get('REPORT_DATE') else ''
-                return {
-                    'roe': custom_roe,
-                    'bps': bps,
-                    'report_date': report_date,
-                    'source': f'Custom({custom_roe}%)'
-                }
-            
-            # 2. 从年报数据中获取年度ROE
-            # REPORT_TYPE为"年报"的数据才是年度ROE
-            annual_df = df[df['REPORT_TYPE'].str.contains('年报', na=False)]
-            
-            if len(annual_df) > 0:
-                latest_annual = annual_df.iloc[0]
-                bps = float(latest_annual.get('BPS', 0)) if latest_annual.get('BPS') else 0
-                roe_annual = float(latest_annual.get('ROEJQ', 0)) if latest_annual.get('ROEJQ') else 0
-                report_date = str(latest_annual.get('REPORT_DATE', '')) if latest_annual.get('REPORT_DATE') else ''
-                
-                if roe_annual > 0:
-                    return {
-                        'roe': roe_annual,
-                        'bps': bps,
-                        'report_date': report_date,
-                        'source': f'Annual({report_date[:10]}, {roe_annual}%)'
-                    }
-            
-            # 如果年报ROE为空，提示用户
-            print(f"    [Warning] {symbol} 年度ROE数据为空")
-            bps = float(df.iloc[0].get('BPS', 0)) if df.iloc[0].get('BPS') else 0
-            report_date = str(df.iloc[0].get('REPORT_DATE', '')) if df.iloc[0].get('REPORT_DATE') else ''
-            return {
-                'roe': 0,
-                'bps': bps,
-                'report_date': report_date,
-                'source': 'Annual(Empty)'
-            }
-        return None
+
+        if len(df) == 0:
+            return None
+        first_idx = df.index[0]
+
+        # REPORT_TYPE为"年报"的数据才是年度ROE；
+        # 行按报告期降序排列，扫到第一条"年报"即可，不必对整列跑正则掩码
+        annual_idx = next(
+            (i for i, t in zip(df.index, df['REPORT_TYPE'].to_numpy())
+             if t and '年报' in str(t)), None)
+
+        payload = {
+            'bps_latest': float(_scalar(df, first_idx, 'BPS')),
+            'report_date_latest': str(_scalar(df, first_idx, 'REPORT_DATE', '')),
+            'roe_annual': 0,
+            'bps_annual': 0,
+            'report_date_annual': '',
+        }
+        if annual_idx is not None:
+            payload['roe_annual'] = float(_scalar(df, annual_idx, 'ROEJQ'))
+            payload['bps_annual'] = float(_scalar(df, annual_idx, 'BPS'))
+            payload['report_date_annual'] = str(_scalar(df, annual_idx, 'REPORT_DATE', ''))
+        return payload
     except Exception as e:
         print(f"    [财务] 获取失败: {e}")
         return None
-
-
+
+
+def get_financial_data_akshare(symbol: str) -> dict:
+    """
+    从akshare获取财务数据 (ROE, BPS)
+    优先级：自定义ROE > 年度ROE(从年报数据中获取ROEJQ)
+    自定义ROE在缓存之外应用，改config立即生效
+    """
+    fin = _fetch_financial_akshare(symbol)
+    if fin is None:
+        return None
+
+    # 1. 优先使用自定义ROE
+    custom_roe = get_custom_roe(symbol)
+    if custom_roe is not None:
+        return {
+            'roe': custom_roe,
+            'bps': fin['bps_latest'],
+            'report_date': fin['report_date_latest'],
+            'source': f'Custom({custom_roe}%)'
+        }
+
+    # 2. 年度ROE
+    roe_annual = fin['roe_annual']
+    if roe_annual > 0:
+        report_date = fin['report_date_annual']
+        return {
+            'roe': roe_annual,
+            'bps': fin['bps_annual'],
+            'report_date': report_date,
+            'source': f'Annual({report_date[:10]}, {roe_annual}%)'
+        }
+
+    # 如果年报ROE为空，提示用户
+    print(f"    [Warning] {symbol} 年度ROE数据为空")
+    return {
+        'roe': 0,
+        'bps': fin['bps_latest'],
+        'report_date': fin['report_date_latest'],
+        'source': 'Annual(Empty)'
+    }
+
+
+# stock_fhps_em返回的是全市场分红表，同一日期只需下载一次、所有股票共享；
+# 锁防止并发抓取同一日期时重复下载
+_fhps_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=8)
+def _fhps_table_cached(date: str):
+    return ak.stock_fhps_em(date=date)
+
+
+def _fhps_table(date: str):
+    """按日期获取全市场分红表（进程内缓存）"""
+    with _fhps_lock:
+        return _fhps_table_cached(date)
+
+
 def get_dividend_data_akshare(symbol: str, price: float = 0) -> dict:
     """
     从akshare动态获取分红数据
@@ -161,8 +281,6 @@ def get_dividend_data_akshare(symbol: str, price: float = 0) -> dict:
         因为2024年度分红已经包含了2024年中期分红
     """
     try:
-        import akshare as ak
-        
         interim_2025 = 0  # 2025年中期
         annual_2024 = 0   # 2024年度
         interim_2024 = 0  # 2024年中期（需要从年度中减去）
@@ -171,34 +289,39 @@ def get_dividend_data_akshare(symbol: str, price: float = 0) -> dict:
         
         # 获取2025年中期分红
         try:
-            df = ak.stock_fhps_em(date='20250630')
+            df = _fhps_table('20250630')
             stock = df[df['代码'] == symbol[2:]]
             if len(stock) > 0:
-                interim_2025 = float(stock.iloc[0].iloc[7]) if stock.iloc[0].iloc[7] else 0
+                val = stock.iloc[0, 7]
+                interim_2025 = float(val) if val else 0
                 # Column 5 is already in percentage format (e.g., 12.70 = 12.70%)
                 # Column 6 is decimal format (e.g., 0.0246 = 2.46%)
                 # Use Column 5 directly as it's the dividend yield percentage
-                interim_2025_yield = float(stock.iloc[0].iloc[5]) if stock.iloc[0].iloc[5] else 0
+                val = stock.iloc[0, 5]
+                interim_2025_yield = float(val) if val else 0
         except:
             pass
         
         # 获取2024年度分红
         try:
-            df = ak.stock_fhps_em(date='20241231')
+            df = _fhps_table('20241231')
             stock = df[df['代码'] == symbol[2:]]
             if len(stock) > 0:
-                annual_2024 = float(stock.iloc[0].iloc[7]) if stock.iloc[0].iloc[7] else 0
+                val = stock.iloc[0, 7]
+                annual_2024 = float(val) if val else 0
                 # Column 5 is already in percentage format (e.g., 12.70 = 12.70%)
-                annual_2024_yield = float(stock.iloc[0].iloc[5]) if stock.iloc[0].iloc[5] else 0
+                val = stock.iloc[0, 5]
+                annual_2024_yield = float(val) if val else 0
         except:
             pass
         
         # 获取2024年中期分红
         try:
-            df = ak.stock_fhps_em(date='20240630')
+            df = _fhps_table('20240630')
             stock = df[df['代码'] == symbol[2:]]
             if len(stock) > 0:
-                interim_2024 = float(stock.iloc[0].iloc[7]) if stock.iloc[0].iloc[7] else 0
+                val = stock.iloc[0, 7]
+                interim_2024 = float(val) if val else 0
         except:
             pass
         
@@ -229,8 +352,14 @@ def get_dividend_data_akshare(symbol: str, price: float = 0) -> dict:
             'dividend_yield_annual': 0,
             'source': f'Error: {e}'
         }
-
-
+
+
+def tee(msg: str):
+    """同一条消息同时写控制台和日志，只格式化一次"""
+    print(msg)
+    logger.info(msg)
+
+
 def get_guaranteed_dividend_note(symbol: str) -> str:
     """
     获取保底分红备注
@@ -244,64 +373,98 @@ def get_guaranteed_dividend_note(symbol: str) -> str:
         'SZ002304': "【保底分红】洋河股份：需查阅公司公告确认是否有未来三年保底分红承诺",
     }
     return guaranteed_notes.get(symbol, "【保底分红】需查阅公司公告确认")
-
-
-def run_roi_analysis():
-    """运行ROI分析程序"""
-    from roi import ROICalculator
-    
-    # 股票列表
-    stocks = [
-        {"name": "东阿阿胶", "symbol": "SZ000423"},
-        {"name": "五粮液", "symbol": "SZ000858"},
-        {"name": "贵州茅台", "symbol": "SH600519"},
-        {"name": "洋河股份", "symbol": "SZ002304"}
-    ]
-    
-    print("\n" + "=" * 70)
-    print("  投资回报率统计器 (增强版 - 动态数据)")
-    print(f"  日期: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("=" * 70)
-    
-    logger.info("=" * 70)
-    logger.info("ROI Calculator (Enhanced Version) Started")
-    logger.info(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    logger.info(f"Stocks: {len(stocks)}")
-    logger.info("Data Source: Tencent (price) + akshare (finance + dividend)")
-    logger.info("=" * 70)
-    
-    print(f"\n分析 {len(stocks)} 只股票")
-    print("数据来源: 腾讯(价格) + akshare(财务+分红)")
-    
-    output_dir = "data/output"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    start_time = time.time()
-    calculator = ROICalculator()
-    results = []
-    
-    for stock in stocks:
-        name = stock['name']
-        symbol = stock['symbol']
-        print(f"\n处理 {name} ({symbol})...", end=" ", flush=True)
-        logger.info(f"[{name}] Processing...")
-        
-        try:
-            # 1. 获取价格
-            data = get_stock_data_tencent(symbol)
-            price = data['price'] if data else 0
-            logger.info(f"[{name}] Price: {price}")
-            
-            # 2. 获取财务数据 (ROE, BPS)
-            fin_data = get_financial_data_akshare(symbol)
+
+
+def _build_result(calculator, shared, dividend_yield, cash_div,
+                  dividend_source, pb_source, guaranteed_note,
+                  interim_dividend, annual_dividend):
+    """按口径构造结果对象：LTM/年度两个口径只有分红输入和来源描述不同"""
+    result = calculator.calculate(dict(
+        shared,
+        dividend_yield=dividend_yield,
+        dividend={'dividends': [{'cash_div': cash_div}]}))
+    result.data_source = '腾讯+akshare'
+    result.dividend_source = dividend_source
+    result.pb_source = pb_source
+    result.guaranteed_note = guaranteed_note
+    result.interim_dividend = interim_dividend
+    result.annual_dividend = annual_dividend
+    return result
+
+
+def fetch_stock_bundle(symbol: str, data: dict = None) -> tuple:
+    """抓取单只股票的全部数据：先取价格（分红的LTM股息率依赖价格），
+    财务和分红再并发抓取；data可由批量行情预先提供"""
+    if data is None:
+        data = get_stock_data_tencent(symbol)
+    price = data['price'] if data else 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+        fin_future = pool.submit(get_financial_data_akshare, symbol)
+        div_future = pool.submit(get_dividend_data_akshare, symbol, price)
+        return data, fin_future.result(), div_future.result()
+
+
+def run_roi_analysis():
+    """运行ROI分析程序"""
+    from roi import ROICalculator
+    
+    # 股票列表
+    stocks = [
+        {"name": "东阿阿胶", "symbol": "SZ000423"},
+        {"name": "五粮液", "symbol": "SZ000858"},
+        {"name": "贵州茅台", "symbol": "SH600519"},
+        {"name": "洋河股份", "symbol": "SZ002304"}
+    ]
+    
+    print("\n" + "=" * 70)
+    print("  投资回报率统计器 (增强版 - 动态数据)")
+    print(f"  日期: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 70)
+    
+    logger.info("=" * 70)
+    logger.info("ROI Calculator (Enhanced Version) Started")
+    logger.info(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info(f"Stocks: {len(stocks)}")
+    logger.info("Data Source: Tencent (price) + akshare (finance + dividend)")
+    logger.info("=" * 70)
+    
+    print(f"\n分析 {len(stocks)} 只股票")
+    print("数据来源: 腾讯(价格) + akshare(财务+分红)")
+    
+    output_dir = "data/output"
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    
+    start_time = time.time()
+    calculator = ROICalculator()
+    results = []
+    
+    # 价格先批量取一次（N个代码一个请求），失败的代码在bundle里回退单只请求；
+    # 其余网络抓取并发执行：串行N×3次往返变成一批并行请求
+    symbols = [s['symbol'] for s in stocks]
+    price_map = get_stock_data_tencent_batch(symbols)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(stocks))) as pool:
+        bundles = list(pool.map(
+            lambda s: fetch_stock_bundle(s, price_map.get(s)), symbols))
+
+    for stock, (data, fin_data, div_data) in zip(stocks, bundles):
+        name = stock['name']
+        symbol = stock['symbol']
+        print(f"\n处理 {name} ({symbol})...", end=" ", flush=True)
+        logger.info(f"[{name}] Processing...")
+
+        try:
+            # 1. 价格
+            price = data['price'] if data else 0
+            logger.info(f"[{name}] Price: {price}")
+
+            # 2. 财务数据 (ROE, BPS)
             roe = fin_data['roe'] if fin_data else 0
             bps = fin_data['bps'] if fin_data else 0
             pb = round(price / bps, 2) if price > 0 and bps > 0 else 0
             logger.info(f"[{name}] ROE: {roe}%, BPS: {bps}, PB: {pb}")
-            
-            # 3. 获取分红数据(传入股价，使用akshare提供的股息率)
-            div_data = get_dividend_data_akshare(symbol, price)
+
+            # 3. 分红数据(已传入股价，使用akshare提供的股息率)
             interim_2025 = div_data['interim_dividend']
             annual_2024 = div_data['annual_dividend']
             interim_2024 = div_data['interim_2024']
@@ -316,239 +479,224 @@ def run_roi_analysis():
             print(f"    LTM={total_ltm} ({annual_2024}-{interim_2024}+{interim_2025})")
             print(f"    股息率: LTM={dividend_yield_ltm:.2f}%, 年度={dividend_yield_annual:.2f}%")
             
-            # 创建两个结果对象
-            # 结果1: 使用LTM分红
-            stock_data_ltm = {
+            # 创建两个结果对象：两个口径共享价格/ROE/PB，只有分红输入不同
+            shared = {
                 'name': name,
                 'symbol': symbol,
                 'current_price': price,
                 'financial': {'roe': roe, 'pb': pb},
-                'dividend_yield': dividend_yield_ltm,
-                'dividend': {'dividends': [{'cash_div': total_ltm}]}
             }
-            
-            result_ltm = calculator.calculate(stock_data_ltm)
-            result_ltm.data_source = '腾讯+akshare'
-            result_ltm.dividend_source = f"LTM({annual_2024}-{interim_2024}+{interim_2025})"
-            result_ltm.pb_source = f'akshare(Price={price}/BPS={bps:.2f})'
-            result_ltm.guaranteed_note = get_guaranteed_dividend_note(symbol)
-            result_ltm.interim_dividend = interim_2025
-            result_ltm.annual_dividend = annual_2024
+            pb_source = f'akshare(Price={price}/BPS={bps:.2f})'
+            guaranteed_note = get_guaranteed_dividend_note(symbol)
+
+            # 结果1: 使用LTM分红
+            result_ltm = _build_result(
+                calculator, shared, dividend_yield_ltm, total_ltm,
+                f"LTM({annual_2024}-{interim_2024}+{interim_2025})",
+                pb_source, guaranteed_note, interim_2025, annual_2024)
             results.append(result_ltm)
-            
+
             # 结果2: 使用年度分红
-            stock_data_annual = {
-                'name': name,
-                'symbol': symbol,
-                'current_price': price,
-                'financial': {'roe': roe, 'pb': pb},
-                'dividend_yield': dividend_yield_annual,
-                'dividend': {'dividends': [{'cash_div': annual_2024}]}
-            }
-            
-            result_annual = calculator.calculate(stock_data_annual)
-            result_annual.data_source = '腾讯+akshare'
-            result_annual.dividend_source = f"年度分配({annual_2024})"
-            result_annual.pb_source = f'akshare(Price={price}/BPS={bps:.2f})'
-            result_annual.guaranteed_note = get_guaranteed_dividend_note(symbol)
-            result_annual.interim_dividend = 0
-            result_annual.annual_dividend = annual_2024
+            result_annual = _build_result(
+                calculator, shared, dividend_yield_annual, annual_2024,
+                f"年度分配({annual_2024})",
+                pb_source, guaranteed_note, 0, annual_2024)
             results.append(result_annual)
             
             logger.info(f"[{name}] KouJing1(LTM): F1={result_ltm.roi_formula1:.2f}%, F2={result_ltm.roi_formula2:.2f}%")
             logger.info(f"[{name}] KouJing2(Annual): F1={result_annual.roi_formula1:.2f}%, F2={result_annual.roi_formula2:.2f}%")
-            
-        except Exception as e:
-            print(f"处理失败: {e}")
-            logger.error(f"[{name}] Error: {e}")
-            continue
-        
-        elapsed = time.time() - start_time
-        print(f"\n数据获取耗时: {elapsed:.1f}秒")
-        logger.info(f"Data fetch time: {elapsed:.1f} seconds")
-        
-        if results:
-            logger.info("=" * 100)
-            logger.info("ROI Summary")
-            logger.info("=" * 100)
-            
-            print("\n" + "=" * 100)
-            print("  投资回报率对比汇总")
-            print("=" * 100)
-            
-            # 按类型分组显示
-            ltm_results = [r for r in results if 'LTM' in r.dividend_source]
-            annual_results = [r for r in results if '年度分配' in r.dividend_source]
-            
-            # 显示LTM结果
-            print("\n【口径一：最近12个月分红 (2024年度 + 2025中期)】")
-            logger.info("\n[KouJing1: LTM]")
-            print(f"{'股票名称':<12} {'代码':<10} {'股价':<10} {'ROE':<8} {'PB':<8} {'分红':<10} {'股息率':<10} {'ROE/PB':<10}")
-            print("-" * 90)
-            logger.info(f"{'Name':<12} {'Code':<10} {'Price':<10} {'ROE':<8} {'PB':<8} {'Div':<10} {'F1-Yield':<10} {'F2-ROE/PB':<10}")
-            logger.info("-" * 90)
             
-            valid_ltm = [r for r in ltm_results if r.roi_formula1 and r.roi_formula1 > 0]
-            sorted_ltm = sorted(valid_ltm, key=lambda x: x.roi_formula1, reverse=True)
-            for r in sorted_ltm:
-                print(f"{r.stock_name:<12} {r.symbol:<10} {r.current_price:<10.2f} {r.roe:<8.2f} {r.pb:<8.2f} {r.dividend_per_share:<10.4f} {r.roi_formula1:<10.2f}% {r.roi_formula2:<10.2f}%")
-                logger.info(f"{r.stock_name:<12} {r.symbol:<10} {r.current_price:<10.2f} {r.roe:<8.2f} {r.pb:<8.2f} {r.dividend_per_share:<10.4f} {r.roi_formula1:<10.2f}% {r.roi_formula2:<10.2f}%")
+        except Exception as e:
+            print(f"处理失败: {e}")
+            logger.error(f"[{name}] Error: {e}")
+            continue
+        
+    elapsed = time.time() - start_time
+    print(f"\n数据获取耗时: {elapsed:.1f}秒")
+    logger.info(f"Data fetch time: {elapsed:.1f} seconds")
+        
+    if results:
+        logger.info("=" * 100)
+        logger.info("ROI Summary")
+        logger.info("=" * 100)
             
-            if sorted_ltm:
-                print("\n  股息率排名(LTM):")
-                logger.info("\n  Ranking (F1 Yield):")
-                for i, r in enumerate(sorted_ltm, 1):
-                    print(f"    {i}. {r.stock_name}: {r.roi_formula1:.2f}%")
-                    logger.info(f"    {i}. {r.stock_name}: {r.roi_formula1:.2f}%")
-        
-            # 显示年度分配结果
-            print("\n【口径二：年度分配分红 (仅2024年度)】")
-            logger.info("\n[KouJing2: Annual]")
-            print(f"{'股票名称':<12} {'代码':<10} {'股价':<10} {'ROE':<8} {'PB':<8} {'分红':<10} {'股息率':<10} {'ROE/PB':<10}")
-            print("-" * 90)
-            logger.info(f"{'Name':<12} {'Code':<10} {'Price':<10} {'ROE':<8} {'PB':<8} {'Div':<10} {'F1-Yield':<10} {'F2-ROE/PB':<10}")
-            logger.info("-" * 90)
-        
-            valid_annual = [r for r in annual_results if r.roi_formula1 and r.roi_formula1 > 0]
-            sorted_annual = sorted(valid_annual, key=lambda x: x.roi_formula1, reverse=True)
-            for r in sorted_annual:
-                print(f"{r.stock_name:<12} {r.symbol:<10} {r.current_price:<10.2f} {r.roe:<8.2f} {r.pb:<8.2f} {r.dividend_per_share:<10.4f} {r.roi_formula1:<10.2f}% {r.roi_formula2:<10.2f}%")
-                logger.info(f"{r.stock_name:<12} {r.symbol:<10} {r.current_price:<10.2f} {r.roe:<8.2f} {r.pb:<8.2f} {r.dividend_per_share:<10.4f} {r.roi_formula1:<10.2f}% {r.roi_formula2:<10.2f}%")
-        
-            if sorted_annual:
-                print("\n  股息率排名(年度):")
-                logger.info("\n  Ranking (F1 Yield):")
-                for i, r in enumerate(sorted_annual, 1):
-                    print(f"    {i}. {r.stock_name}: {r.roi_formula1:.2f}%")
-                    logger.info(f"    {i}. {r.stock_name}: {r.roi_formula1:.2f}%")
-        
-            # ROE/PB排名
-            print("\n【公式二：ROE/PB 排名】")
-            logger.info("\n[Formula 2: ROE/PB Ranking]")
-            all_results = ltm_results  # 使用LTM结果
-            valid_f2 = [r for r in all_results if r.roi_formula2 and r.roi_formula2 > 0]
-            sorted_f2 = sorted(valid_f2, key=lambda x: x.roi_formula2, reverse=True)
-            for i, r in enumerate(sorted_f2, 1):
-                print(f"    {i}. {r.stock_name}: {r.roi_formula2:.2f}%")
-                logger.info(f"    {i}. {r.stock_name}: {r.roi_formula2:.2f}%")
-        
-            print("\n" + "=" * 100)
-        
-            # 保存结果（使用时间戳命名）
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            save_to_excel(ltm_results, annual_results, output_dir, timestamp)
-        
-            # 打印备注
-            print("\n【保底分红备注】")
-            logger.info("\n[Guaranteed Dividend Notes]")
-            for stock in stocks:
-                symbol = stock['symbol']
-                ltm_r = next((r for r in ltm_results if r.symbol == symbol), None)
-                if ltm_r:
-                    print(f"  {stock['name']}: {ltm_r.guaranteed_note}")
-                    logger.info(f"  {stock['name']}: {ltm_r.guaranteed_note}")
-        
-            print("\n" + "=" * 100)
-            print("计算公式说明:")
-            print("  公式一 = (分红 / 当前股价) × 100%")
-            print("  公式二 = ROE / PB × 100% (注: ROE不带百分号直接相除)")
-            print("  LTM = 最近12个月分红 = 2024年度分红 + 2025年中期分红")
-            print("=" * 100)
-        
-            logger.info("=" * 100)
-            logger.info("Formulas:")
-            logger.info("  F1 = (Dividend / Price) x 100%")
-            logger.info("  F2 = ROE / PB x 100%")
-            logger.info("  LTM = 2024 Annual + 2025 Mid")
-            logger.info("=" * 100)
-            logger.info(f"Output files saved to: {output_dir}")
-            logger.info("ROI Calculator (Enhanced Version) Completed")
-            logger.info("=" * 70)
-
-
-def save_to_excel(ltm_results, annual_results, output_dir, timestamp=""):
-    """保存结果到Excel（使用时间戳命名，直接保存在data目录）"""
-    try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment
-        
-        # 使用时间戳命名文件，直接保存在data目录
-        if timestamp:
-            excel_path = os.path.join(output_dir, f"roi_{timestamp}.xlsx")
-            chart_path = os.path.join(output_dir, f"roi_{timestamp}.png")
-        else:
-            excel_path = os.path.join(output_dir, "roi_analysis.xlsx")
-            chart_path = os.path.join(output_dir, "roi_analysis.png")
-        
-        wb = Workbook()
-        
-        # LTM结果表
-        ws1 = wb.active
-        ws1.title = "LTM分红"
-        
+        print("\n" + "=" * 100)
+        print("  投资回报率对比汇总")
+        print("=" * 100)
+            
+        # 按类型分组显示
+        ltm_results = [r for r in results if 'LTM' in r.dividend_source]
+        annual_results = [r for r in results if '年度分配' in r.dividend_source]
+            
+        # 显示LTM结果
+        print("\n【口径一：最近12个月分红 (2024年度 + 2025中期)】")
+        logger.info("\n[KouJing1: LTM]")
+        print(f"{'股票名称':<12} {'代码':<10} {'股价':<10} {'ROE':<8} {'PB':<8} {'分红':<10} {'股息率':<10} {'ROE/PB':<10}")
+        print("-" * 90)
+        logger.info(f"{'Name':<12} {'Code':<10} {'Price':<10} {'ROE':<8} {'PB':<8} {'Div':<10} {'F1-Yield':<10} {'F2-ROE/PB':<10}")
+        logger.info("-" * 90)
+            
+        valid_ltm = [r for r in ltm_results if r.roi_formula1 and r.roi_formula1 > 0]
+        sorted_ltm = sorted(valid_ltm, key=lambda x: x.roi_formula1, reverse=True)
+        for r in sorted_ltm:
+            tee(f"{r.stock_name:<12} {r.symbol:<10} {r.current_price:<10.2f} {r.roe:<8.2f} {r.pb:<8.2f} {r.dividend_per_share:<10.4f} {r.roi_formula1:<10.2f}% {r.roi_formula2:<10.2f}%")
+
+        if sorted_ltm:
+            print("\n  股息率排名(LTM):")
+            logger.info("\n  Ranking (F1 Yield):")
+            for i, r in enumerate(sorted_ltm, 1):
+                tee(f"    {i}. {r.stock_name}: {r.roi_formula1:.2f}%")
+        
+        # 显示年度分配结果
+        print("\n【口径二：年度分配分红 (仅2024年度)】")
+        logger.info("\n[KouJing2: Annual]")
+        print(f"{'股票名称':<12} {'代码':<10} {'股价':<10} {'ROE':<8} {'PB':<8} {'分红':<10} {'股息率':<10} {'ROE/PB':<10}")
+        print("-" * 90)
+        logger.info(f"{'Name':<12} {'Code':<10} {'Price':<10} {'ROE':<8} {'PB':<8} {'Div':<10} {'F1-Yield':<10} {'F2-ROE/PB':<10}")
+        logger.info("-" * 90)
+        
+        valid_annual = [r for r in annual_results if r.roi_formula1 and r.roi_formula1 > 0]
+        sorted_annual = sorted(valid_annual, key=lambda x: x.roi_formula1, reverse=True)
+        for r in sorted_annual:
+            tee(f"{r.stock_name:<12} {r.symbol:<10} {r.current_price:<10.2f} {r.roe:<8.2f} {r.pb:<8.2f} {r.dividend_per_share:<10.4f} {r.roi_formula1:<10.2f}% {r.roi_formula2:<10.2f}%")
+
+        if sorted_annual:
+            print("\n  股息率排名(年度):")
+            logger.info("\n  Ranking (F1 Yield):")
+            for i, r in enumerate(sorted_annual, 1):
+                tee(f"    {i}. {r.stock_name}: {r.roi_formula1:.2f}%")
+        
+        # ROE/PB排名
+        print("\n【公式二：ROE/PB 排名】")
+        logger.info("\n[Formula 2: ROE/PB Ranking]")
+        all_results = ltm_results  # 使用LTM结果
+        valid_f2 = [r for r in all_results if r.roi_formula2 and r.roi_formula2 > 0]
+        sorted_f2 = sorted(valid_f2, key=lambda x: x.roi_formula2, reverse=True)
+        for i, r in enumerate(sorted_f2, 1):
+            tee(f"    {i}. {r.stock_name}: {r.roi_formula2:.2f}%")
+        
+        print("\n" + "=" * 100)
+        
+        # 保存结果（使用时间戳命名）
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        save_to_excel(ltm_results, annual_results, output_dir, timestamp)
+        
+        # 打印备注
+        print("\n【保底分红备注】")
+        logger.info("\n[Guaranteed Dividend Notes]")
+        for stock in stocks:
+            symbol = stock['symbol']
+            ltm_r = next((r for r in ltm_results if r.symbol == symbol), None)
+            if ltm_r:
+                tee(f"  {stock['name']}: {ltm_r.guaranteed_note}")
+        
+        print("\n" + "=" * 100)
+        print("计算公式说明:")
+        print("  公式一 = (分红 / 当前股价) × 100%")
+        print("  公式二 = ROE / PB × 100% (注: ROE不带百分号直接相除)")
+        print("  LTM = 最近12个月分红 = 2024年度分红 + 2025年中期分红")
+        print("=" * 100)
+        
+        logger.info("=" * 100)
+        logger.info("Formulas:")
+        logger.info("  F1 = (Dividend / Price) x 100%")
+        logger.info("  F2 = ROE / PB x 100%")
+        logger.info("  LTM = 2024 Annual + 2025 Mid")
+        logger.info("=" * 100)
+        logger.info(f"Output files saved to: {output_dir}")
+        logger.info("ROI Calculator (Enhanced Version) Completed")
+        logger.info("=" * 70)
+
+
+def save_to_excel(ltm_results, annual_results, output_dir, timestamp=""):
+    """保存结果到Excel（使用时间戳命名，直接保存在data目录）"""
+    try:
+        # 使用时间戳命名文件，直接保存在data目录
+        if timestamp:
+            excel_path = os.path.join(output_dir, f"roi_{timestamp}.xlsx")
+        else:
+            excel_path = os.path.join(output_dir, "roi_analysis.xlsx")
+
+        # write_only模式按行流式写XML，不构建内存单元格图
+        wb = Workbook(write_only=True)
+
+        header_font = Font(bold=True)
+        header_align = Alignment(horizontal='center')
+
+        def _header_row(ws, headers):
+            cells = []
+            for header in headers:
+                cell = WriteOnlyCell(ws, value=header)
+                cell.font = header_font
+                cell.alignment = header_align
+                cells.append(cell)
+            return cells
+
+        # LTM结果表（write_only下列宽必须在写入行之前设置）
+        ws1 = wb.create_sheet("LTM分红")
+        for col, width in zip('ABCDEFGHIJK', (12, 10, 10, 8, 8, 12, 12, 12, 12, 12, 50)):
+            ws1.column_dimensions[col].width = width
+
         headers1 = ["股票名称", "代码", "股价(元)", "ROE(%)", "PB", "年度分红", "中期分红", "LTM分红", "股息率(%)", "ROE/PB(%)", "保底分红备注"]
-        for col, header in enumerate(headers1, 1):
-            cell = ws1.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal='center')
-        
-        for row_idx, r in enumerate(ltm_results, 2):
-            ws1.cell(row=row_idx, column=1, value=r.stock_name)
-            ws1.cell(row=row_idx, column=2, value=r.symbol)
-            ws1.cell(row=row_idx, column=3, value=round(r.current_price, 2))
-            ws1.cell(row=row_idx, column=4, value=round(r.roe, 2))
-            ws1.cell(row=row_idx, column=5, value=round(r.pb, 2))
-            ws1.cell(row=row_idx, column=6, value=r.annual_dividend)
-            ws1.cell(row=row_idx, column=7, value=r.interim_dividend)
-            ws1.cell(row=row_idx, column=8, value=r.dividend_per_share)
-            ws1.cell(row=row_idx, column=9, value=f"{r.roi_formula1:.2f}%")
-            ws1.cell(row=row_idx, column=10, value=f"{r.roi_formula2:.2f}%")
-            ws1.cell(row=row_idx, column=11, value=r.guaranteed_note)
-        
+        ws1.append(_header_row(ws1, headers1))
+        for r in ltm_results:
+            ws1.append([r.stock_name, r.symbol, round(r.current_price, 2),
+                        round(r.roe, 2), round(r.pb, 2), r.annual_dividend,
+                        r.interim_dividend, r.dividend_per_share,
+                        f"{r.roi_formula1:.2f}%", f"{r.roi_formula2:.2f}%",
+                        r.guaranteed_note])
+
         # 年度分配结果表
         ws2 = wb.create_sheet("年度分配")
-        
+        for col, width in zip('ABCDEFGHI', (12, 10, 10, 8, 8, 12, 12, 12, 50)):
+            ws2.column_dimensions[col].width = width
+
         headers2 = ["股票名称", "代码", "股价(元)", "ROE(%)", "PB", "年度分红(元)", "股息率(%)", "ROE/PB(%)", "保底分红备注"]
-        for col, header in enumerate(headers2, 1):
-            cell = ws2.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal='center')
+        ws2.append(_header_row(ws2, headers2))
+        for r in annual_results:
+            ws2.append([r.stock_name, r.symbol, round(r.current_price, 2),
+                        round(r.roe, 2), round(r.pb, 2), r.annual_dividend,
+                        f"{r.roi_formula1:.2f}%", f"{r.roi_formula2:.2f}%",
+                        r.guaranteed_note])
+
+        wb.save(excel_path)
+        print(f"\nExcel saved: {excel_path}")
         
-        for row_idx, r in enumerate(annual_results, 2):
-            ws2.cell(row=row_idx, column=1, value=r.stock_name)
-            ws2.cell(row=row_idx, column=2, value=r.symbol)
-            ws2.cell(row=row_idx, column=3, value=round(r.current_price, 2))
-            ws2.cell(row=row_idx, column=4, value=round(r.roe, 2))
-            ws2.cell(row=row_idx, column=5, value=round(r.pb, 2))
-            ws2.cell(row=row_idx, column=6, value=r.annual_dividend)
-            ws2.cell(row=row_idx, column=7, value=f"{r.roi_formula1:.2f}%")
-            ws2.cell(row=row_idx, column=8, value=f"{r.roi_formula2:.2f}%")
-            ws2.cell(row=row_idx, column=9, value=r.guaranteed_note)
+        # 保存图表
+        save_enhanced_chart(ltm_results, annual_results, output_dir, timestamp)
         
-        # 调整列宽
-        for ws in [ws1, ws2]:
-            ws.column_dimensions['A'].width = 12
-            ws.column_dimensions['B'].width = 10
-            ws.column_dimensions['C'].width = 10
-            ws.column_dimensions['D'].width = 8
-            ws.column_dimensions['E'].width = 8
-            ws.column_dimensions['F'].width = 12
-            ws.column_dimensions['G'].width = 12
-            ws.column_dimensions['H'].width = 12
-            ws.column_dimensions['I'].width = 12
-            ws.column_dimensions['J'].width = 12
-            ws.column_dimensions['K'].width = 50 if ws == ws1 else 50
-        
-        wb.save(excel_path)
-        print(f"\nExcel saved: {excel_path}")
-        
-        # 保存图表
-        save_enhanced_chart(ltm_results, annual_results, chart_path)
-        
-    except Exception as e:
-        print(f"\n保存Excel失败: {e}")
-
-
+    except Exception as e:
+        print(f"\n保存Excel失败: {e}")
+
+
+@functools.lru_cache(maxsize=1)
+def _chinese_font():
+    """预加载SimHei字体实例，避免每处中文文字都走rcParams字体回退查找"""
+    try:
+        from matplotlib.font_manager import FontProperties
+        font_path = r'C:\Windows\Fonts\simhei.ttf'
+        if os.path.exists(font_path):
+            return FontProperties(fname=font_path)
+    except Exception:
+        pass
+    return None
+
+
+def _render_bar(ax, names, values, title, ylabel, fmt, colors,
+                font_prop=None, scale_ylim=False):
+    """绘制单个柱状图面板并标注数值（三张图共用同一套绘制逻辑）"""
+    bars = ax.bar(names, values, color=colors[:len(names)])
+    ax.set_title(title, fontsize=12, fontweight='bold')
+    ax.set_ylabel(ylabel)
+    if scale_ylim:
+        ax.set_ylim(0, max(values) * 1.3 if values else 10)
+    if font_prop:
+        ax.set_xticks(range(len(names)))
+        ax.set_xticklabels(names, fontproperties=font_prop)
+    # 标签先一次性格式化好，交给bar_label批量放置，不再逐柱ax.text
+    ax.bar_label(bars, labels=[fmt.format(v) for v in values], padding=3)
+
+
 def save_enhanced_chart(ltm_results, annual_results, output_dir, timestamp=""):
     """保存分析图表（生成3张PNG图片）
     - chart1: 口径1 (股息率) + ROE + Price + 分红
@@ -556,140 +704,98 @@ def save_enhanced_chart(ltm_results, annual_results, output_dir, timestamp=""):
     - chart3: 口径1 + 口径2 汇总对比
     """
     try:
-        import matplotlib
-        matplotlib.use('Agg')
-        import matplotlib.pyplot as plt
-        
-        plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']
-        plt.rcParams['axes.unicode_minus'] = False
-        
-        ltm_names = [r.stock_name for r in ltm_results]
-        ltm_f1 = [r.roi_formula1 if r.roi_formula1 else 0 for r in ltm_results]
-        ltm_f2 = [r.roi_formula2 if r.roi_formula2 else 0 for r in ltm_results]
-        roes = [r.roe if r.roe else 0 for r in ltm_results]
-        prices = [r.current_price if r.current_price else 0 for r in ltm_results]
-        ltm_divs = [r.dividend_per_share if r.dividend_per_share else 0 for r in ltm_results]
-        pbs = [r.pb if r.pb else 0 for r in ltm_results]
-        
+        if not ltm_results:
+            return
+
+        # 一次遍历转成并列数组，替代7个独立的列表推导
+        ltm_names, ltm_f1, ltm_f2, roes, prices, ltm_divs, pbs = zip(
+            *((r.stock_name,
+               r.roi_formula1 if r.roi_formula1 else 0,
+               r.roi_formula2 if r.roi_formula2 else 0,
+               r.roe if r.roe else 0,
+               r.current_price if r.current_price else 0,
+               r.dividend_per_share if r.dividend_per_share else 0,
+               r.pb if r.pb else 0) for r in ltm_results))
+        
+        # 输入数据没变就跳过重画：渲染3张150DPI的PNG远贵于一次哈希比对
+        hash_path = os.path.join(output_dir, '.chart_hash')
+        key = hashlib.md5(repr(
+            (ltm_names, ltm_f1, ltm_f2, roes, prices, ltm_divs, pbs)
+        ).encode('utf-8')).hexdigest()
+        try:
+            with open(hash_path, 'r') as f:
+                if f.read().strip() == key:
+                    print("Charts unchanged, skipping render")
+                    return
+        except OSError:
+            pass
+
         colors = ['#4472C4', '#ED7D31', '#70AD47', '#FFC000']
-        
-        # ========== Chart 1: 口径1 (股息率) Analysis ==========
-        fig1, axes1 = plt.subplots(2, 2, figsize=(12, 10))
-        fig1.suptitle(f'Analysis -口径1(股息率)- {datetime.now().strftime("%Y-%m-%d %H:%M")}', fontsize=14, fontweight='bold')
-        
-        # 口径1
-        ax1 = axes1[0, 0]
-        bars1 = ax1.bar(ltm_names, ltm_f1, color=colors[:len(ltm_names)])
-        ax1.set_title('ROI-KouJing1: Dividend Yield (%)', fontsize=12, fontweight='bold')
-        ax1.set_ylabel('Yield (%)')
-        ax1.set_ylim(0, max(ltm_f1) * 1.3 if ltm_f1 else 10)
-        for bar, val in zip(bars1, ltm_f1):
-            ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, f'{val:.2f}%', ha='center', va='bottom')
-        
-        # ROE
-        ax2 = axes1[0, 1]
-        bars2 = ax2.bar(ltm_names, roes, color=colors[:len(ltm_names)])
-        ax2.set_title('ROE (%)', fontsize=12, fontweight='bold')
-        ax2.set_ylabel('ROE (%)')
-        for bar, val in zip(bars2, roes):
-            ax2.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.5, f'{val:.2f}%', ha='center', va='bottom')
-        
-        # Price
-        ax3 = axes1[1, 0]
-        bars3 = ax3.bar(ltm_names, prices, color=colors[:len(ltm_names)])
-        ax3.set_title('Price (yuan)', fontsize=12, fontweight='bold')
-        ax3.set_ylabel('Price (yuan)')
-        for bar, val in zip(bars3, prices):
-            ax3.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 5, f'{val:.2f}', ha='center', va='bottom')
-        
-        # LTM Dividend
-        ax4 = axes1[1, 1]
-        bars4 = ax4.bar(ltm_names, ltm_divs, color=colors[:len(ltm_names)])
-        ax4.set_title('LTM Dividend (yuan)', fontsize=12, fontweight='bold')
-        ax4.set_ylabel('Dividend (yuan)')
-        for bar, val in zip(bars4, ltm_divs):
-            ax4.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, f'{val:.4f}', ha='center', va='bottom')
-        
+        font_prop = _chinese_font()
+        stamp = datetime.now().strftime("%Y-%m-%d %H:%M")
+
+        # ========== Chart 1 & 2: 2x2布局复用同一个Figure ==========
+        fig, axes = plt.subplots(2, 2, figsize=(12, 10))
+
+        fig.suptitle(f'Analysis -口径1(股息率)- {stamp}', fontsize=14, fontweight='bold')
+        _render_bar(axes[0, 0], ltm_names, ltm_f1, 'ROI-KouJing1: Dividend Yield (%)',
+                    'Yield (%)', '{:.2f}%', colors, font_prop, scale_ylim=True)
+        _render_bar(axes[0, 1], ltm_names, roes, 'ROE (%)',
+                    'ROE (%)', '{:.2f}%', colors, font_prop)
+        _render_bar(axes[1, 0], ltm_names, prices, 'Price (yuan)',
+                    'Price (yuan)', '{:.2f}', colors, font_prop)
+        _render_bar(axes[1, 1], ltm_names, ltm_divs, 'LTM Dividend (yuan)',
+                    'Dividend (yuan)', '{:.4f}', colors, font_prop)
+
         plt.tight_layout()
         chart1_path = os.path.join(output_dir, f"ROI_1_{timestamp}.png")
-        fig1.savefig(chart1_path, dpi=150, bbox_inches='tight')
+        fig.savefig(chart1_path, dpi=150, bbox_inches='tight')
         print(f"Chart 1 saved: {chart1_path}")
-        plt.close(fig1)
-        
-        # ========== Chart 2: 口径2 (ROE/PB) Analysis ==========
-        fig2, axes2 = plt.subplots(2, 2, figsize=(12, 10))
-        fig2.suptitle(f'Analysis -口径2(ROE_PB)- {datetime.now().strftime("%Y-%m-%d %H:%M")}', fontsize=14, fontweight='bold')
-        
-        # 口径2
-        ax1 = axes2[0, 0]
-        bars1 = ax1.bar(ltm_names, ltm_f2, color=colors[:len(ltm_names)])
-        ax1.set_title('ROI-KouJing2: ROE/PB (%)', fontsize=12, fontweight='bold')
-        ax1.set_ylabel('ROE/PB (%)')
-        ax1.set_ylim(0, max(ltm_f2) * 1.3 if ltm_f2 else 10)
-        for bar, val in zip(bars1, ltm_f2):
-            ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, f'{val:.2f}%', ha='center', va='bottom')
-        
-        # ROE
-        ax2 = axes2[0, 1]
-        bars2 = ax2.bar(ltm_names, roes, color=colors[:len(ltm_names)])
-        ax2.set_title('ROE (%)', fontsize=12, fontweight='bold')
-        ax2.set_ylabel('ROE (%)')
-        for bar, val in zip(bars2, roes):
-            ax2.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.5, f'{val:.2f}%', ha='center', va='bottom')
-        
-        # Price
-        ax3 = axes2[1, 0]
-        bars3 = ax3.bar(ltm_names, prices, color=colors[:len(ltm_names)])
-        ax3.set_title('Price (yuan)', fontsize=12, fontweight='bold')
-        ax3.set_ylabel('Price (yuan)')
-        for bar, val in zip(bars3, prices):
-            ax3.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 5, f'{val:.2f}', ha='center', va='bottom')
-        
-        # PB
-        ax4 = axes2[1, 1]
-        bars4 = ax4.bar(ltm_names, pbs, color=colors[:len(ltm_names)])
-        ax4.set_title('PB Ratio', fontsize=12, fontweight='bold')
-        ax4.set_ylabel('PB')
-        for bar, val in zip(bars4, pbs):
-            ax4.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, f'{val:.2f}', ha='center', va='bottom')
-        
+
+        # Chart 2: 清空坐标轴重画，跳过第二次figure构建
+        for ax in axes.flat:
+            ax.clear()
+
+        fig.suptitle(f'Analysis -口径2(ROE_PB)- {stamp}', fontsize=14, fontweight='bold')
+        _render_bar(axes[0, 0], ltm_names, ltm_f2, 'ROI-KouJing2: ROE/PB (%)',
+                    'ROE/PB (%)', '{:.2f}%', colors, font_prop, scale_ylim=True)
+        _render_bar(axes[0, 1], ltm_names, roes, 'ROE (%)',
+                    'ROE (%)', '{:.2f}%', colors, font_prop)
+        _render_bar(axes[1, 0], ltm_names, prices, 'Price (yuan)',
+                    'Price (yuan)', '{:.2f}', colors, font_prop)
+        _render_bar(axes[1, 1], ltm_names, pbs, 'PB Ratio',
+                    'PB', '{:.2f}', colors, font_prop)
+
         plt.tight_layout()
         chart2_path = os.path.join(output_dir, f"ROI_2_{timestamp}.png")
-        fig2.savefig(chart2_path, dpi=150, bbox_inches='tight')
+        fig.savefig(chart2_path, dpi=150, bbox_inches='tight')
         print(f"Chart 2 saved: {chart2_path}")
-        plt.close(fig2)
-        
+        plt.close(fig)
+
         # ========== Chart 3: 口径1 + 口径2 Combined ==========
         fig3, axes3 = plt.subplots(1, 2, figsize=(14, 6))
-        fig3.suptitle(f'ROI Combined -口径1+口径2- {datetime.now().strftime("%Y-%m-%d %H:%M")}', fontsize=14, fontweight='bold')
-        
-        # 口径1
-        ax1 = axes3[0]
-        bars1 = ax1.bar(ltm_names, ltm_f1, color=colors[:len(ltm_names)], label='KouJing1')
-        ax1.set_title('ROI-KouJing1: Dividend Yield (%)', fontsize=12, fontweight='bold')
-        ax1.set_ylabel('Yield (%)')
-        ax1.set_ylim(0, max(ltm_f1) * 1.3 if ltm_f1 else 10)
-        for bar, val in zip(bars1, ltm_f1):
-            ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, f'{val:.2f}%', ha='center', va='bottom')
-        
-        # 口径2
-        ax2 = axes3[1]
-        bars2 = ax2.bar(ltm_names, ltm_f2, color=colors[:len(ltm_names)], label='KouJing2')
-        ax2.set_title('ROI-KouJing2: ROE/PB (%)', fontsize=12, fontweight='bold')
-        ax2.set_ylabel('ROE/PB (%)')
-        ax2.set_ylim(0, max(ltm_f2) * 1.3 if ltm_f2 else 10)
-        for bar, val in zip(bars2, ltm_f2):
-            ax2.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, f'{val:.2f}%', ha='center', va='bottom')
-        
+        fig3.suptitle(f'ROI Combined -口径1+口径2- {stamp}', fontsize=14, fontweight='bold')
+
+        _render_bar(axes3[0], ltm_names, ltm_f1, 'ROI-KouJing1: Dividend Yield (%)',
+                    'Yield (%)', '{:.2f}%', colors, font_prop, scale_ylim=True)
+        _render_bar(axes3[1], ltm_names, ltm_f2, 'ROI-KouJing2: ROE/PB (%)',
+                    'ROE/PB (%)', '{:.2f}%', colors, font_prop, scale_ylim=True)
+
         plt.tight_layout()
         chart3_path = os.path.join(output_dir, f"ROI_{timestamp}.png")
         fig3.savefig(chart3_path, dpi=150, bbox_inches='tight')
         print(f"Chart 3 saved: {chart3_path}")
         plt.close(fig3)
-        
+
+        try:
+            with open(hash_path, 'w') as f:
+                f.write(key)
+        except OSError:
+            pass
+
     except Exception as e:
         print(f"Chart error: {e}")
-
-
-if __name__ == "__main__":
-    run_roi_analysis()
+
+
+if __name__ == "__main__":
+    run_roi_analysis()
@@ -5,14 +5,44 @@ ROI计算器 - 极速版
 使用腾讯API获取实时价格，akshare获取财务和分红数据
 """
 
-import sys 
+import sys
 import os
 import time
+import queue
+import atexit
 import requests
 import logging
-import json 
+import json
+import functools
+import concurrent.futures
+from logging.handlers import QueueHandler, QueueListener
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from datetime import datetime
 from roi import ROICalculator
+from cache import cached
+from requests.adapters import HTTPAdapter, Retry
+
+# 自定义ROE配置在导入期读一次，不再每只股票重复import+查异常
+try:
+    from config import CUSTOM_ROE
+except Exception:
+    CUSTOM_ROE = {}
+
+# akshare导入很重（连带pandas），放模块级只付一次：
+# 每次运行必然要用它拉财务和股息数据，懒加载只是把开销挪进首个请求
+import akshare as ak
+
+# matplotlib同理：后端和字体在导入期定好，画图函数不再各自配置
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+
+plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']
+plt.rcParams['axes.unicode_minus'] = False
 
 # 设置编码
 if sys.platform == 'win32':
@@ -34,16 +64,33 @@ log_dir = os.path.join(script_dir, "data", "log")
 os.makedirs(log_dir, exist_ok=True)
 log_file = os.path.join(log_dir, f"roi_fast_{datetime.now().strftime('%Y%m%d')}.log")
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# 日志经队列异步写出：工作线程里logger.info只入队，
+# 文件/控制台IO由监听线程代劳，不阻塞抓取线程
+_log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+_file_handler = logging.FileHandler(log_file, encoding='utf-8')
+_file_handler.setFormatter(_log_formatter)
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(_log_formatter)
+
+_log_queue = queue.SimpleQueue()
+_listener = QueueListener(_log_queue, _file_handler, _stream_handler)
+_listener.start()
+atexit.register(_listener.stop)
+
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
 logger = logging.getLogger(__name__)
 
+# 全局Session：复用TCP连接，带自动重试，供并发线程共享
+_SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(total=2, backoff_factor=0.3,
+                      status_forcelist=(500, 502, 503, 504)),
+)
+_SESSION.mount('https://', _adapter)
+_SESSION.mount('http://', _adapter)
+
 
 def get_stock_data_tencent(symbol: str) -> dict:
     """使用腾讯接口获取数据"""
@@ -54,16 +101,19 @@ def get_stock_data_tencent(symbol: str) -> dict:
             code = 'sz' + symbol[2:]
         
         url = f'https://qt.gtimg.cn/q={code}'
-        response = requests.get(url, timeout=10, headers={
+        response = _SESSION.get(url, timeout=10, headers={
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         
-        text = response.text.strip()
-        parts = text.split('~')
-        
+        # 直接在GBK原始字节上切分，整段响应不做解码；
+        # 只有股票名一个字段需要转成str，float()可直接吃bytes。
+        # 只用到第46个字段，maxsplit截断后面几十个字段的切分和小对象分配
+        raw = response.content.strip()
+        parts = raw.split(b'~', 47)
+
         if len(parts) > 46:
             return {
-                'name': parts[1],
+                'name': parts[1].decode('gbk', errors='replace'),
                 'price': float(parts[3]) if parts[3] else 0,
                 'pe': float(parts[39]) if parts[39] else 0,
                 'pb': float(parts[46]) if parts[46] else 0,
@@ -74,65 +124,58 @@ def get_stock_data_tencent(symbol: str) -> dict:
         return None
 
 
+@functools.lru_cache(maxsize=None)
 def get_custom_roe(symbol: str) -> float:
-    """获取自定义ROE配置"""
+    """
+    获取自定义ROE配置
+    返回: 自定义ROE值(百分比)，如果未配置则返回None
+    """
+    return CUSTOM_ROE.get(symbol)
+
+
+def _scalar(df, idx, col, default=0.0):
+    """df.at标量读取，NaN或缺列回退默认值"""
     try:
-        from config import CUSTOM_ROE
-        return CUSTOM_ROE.get(symbol)
-    except:
-        return None
+        val = df.at[idx, col]
+    except (KeyError, ValueError):
+        return default
+    if val is None or val != val:
+        return default
+    return val
 
 
-def get_financial_data_akshare(symbol: str) -> dict:
-    """
-    从akshare获取财务数据
-    优先级：自定义ROE > 年度ROE(从年报数据中获取ROEJQ)
-    """
+@cached('financial_fast', ttl=7 * 86400)
+def _fetch_financial_akshare(symbol: str) -> dict:
+    """拉取并精简akshare财务指标（纯网络部分，结果进磁盘缓存）"""
     try:
-        import akshare as ak
-        
         if symbol.startswith('SH'):
             akshare_code = symbol[2:] + ".SH"
         else:
             akshare_code = symbol[2:] + ".SZ"
-        
+
         df = ak.stock_financial_analysis_indicator_em(symbol=akshare_code)
-        
+
         if len(df) > 0:
-            # 1. 优先使用自定义ROE
-            custom_roe = get_custom_roe(symbol)
-            if custom_roe is not None:
-                bps = float(df.iloc[0].get('BPS', 0)) if df.iloc[0].get('BPS') else 0
-                return {
-                    'roe': custom_roe,
-                    'bps': bps,
-                    'source': f'Custom({custom_roe}%)'
-                }
-            
-            # 2. 从年报数据中获取年度ROE
-            # REPORT_TYPE为"年报"的数据才是年度ROE
-            annual_df = df[df['REPORT_TYPE'].str.contains('年报', na=False)]
-            
-            if len(annual_df) > 0:
-                latest_annual = annual_df.iloc[0]
-                bps = float(latest_annual.get('BPS', 0)) if latest_annual.get('BPS') else 0
-                roe_annual = float(latest_annual.get('ROEJQ', 0)) if latest_annual.get('ROEJQ') else 0
-                report_date = str(latest_annual.get('REPORT_DATE', '')) if latest_annual.get('REPORT_DATE') else ''
-                
-                if roe_annual > 0:
-                    return {
-                        'roe': roe_annual,
-                        'bps': bps,
-                        'source': f'Annual({report_date[:10]}, {roe_annual}%)'
-                    }
-            
-            # 如果年报ROE为空，提示用户
-            print(f"    [Warning] {symbol} 年度ROE数据为空")
-            bps = float(df.iloc[0].get('BPS', 0)) if df.iloc[0].get('BPS') else 0
+            bps_latest = float(_scalar(df, df.index[0], 'BPS') or 0)
+
+            # REPORT_TYPE为"年报"的行才是年度ROE；数据按报告期降序，
+            # 顺序扫到第一条即停，不用为取一行构造整列布尔掩码
+            annual_idx = next((idx for idx, rt in df['REPORT_TYPE'].items()
+                               if isinstance(rt, str) and '年报' in rt), None)
+
+            roe_annual = 0
+            bps_annual = 0
+            report_date = ''
+            if annual_idx is not None:
+                bps_annual = float(_scalar(df, annual_idx, 'BPS') or 0)
+                roe_annual = float(_scalar(df, annual_idx, 'ROEJQ') or 0)
+                report_date = str(_scalar(df, annual_idx, 'REPORT_DATE', default='') or '')
+
             return {
-                'roe': 0,
-                'bps': bps,
-                'source': 'Annual(Empty)'
+                'bps_latest': bps_latest,
+                'roe_annual': roe_annual,
+                'bps_annual': bps_annual,
+                'report_date': report_date,
             }
         return None
     except Exception as e:
@@ -140,6 +183,42 @@ def get_financial_data_akshare(symbol: str) -> dict:
         return None
 
 
+def get_financial_data_akshare(symbol: str) -> dict:
+    """
+    从akshare获取财务数据（网络部分走磁盘缓存）
+    优先级：自定义ROE > 年度ROE(从年报数据中获取ROEJQ)
+    自定义ROE在缓存之外应用，改config后无需等缓存过期
+    """
+    fetched = _fetch_financial_akshare(symbol)
+    if fetched is None:
+        return None
+
+    # 1. 优先使用自定义ROE
+    custom_roe = get_custom_roe(symbol)
+    if custom_roe is not None:
+        return {
+            'roe': custom_roe,
+            'bps': fetched['bps_latest'],
+            'source': f'Custom({custom_roe}%)'
+        }
+
+    # 2. 从年报数据中获取年度ROE
+    if fetched['roe_annual'] > 0:
+        return {
+            'roe': fetched['roe_annual'],
+            'bps': fetched['bps_annual'],
+            'source': f"Annual({fetched['report_date'][:10]}, {fetched['roe_annual']}%)"
+        }
+
+    # 如果年报ROE为空，提示用户
+    print(f"    [Warning] {symbol} 年度ROE数据为空")
+    return {
+        'roe': 0,
+        'bps': fetched['bps_latest'],
+        'source': 'Annual(Empty)'
+    }
+
+
 def load_stocks() -> list:
     """
     加载股票列表
@@ -152,8 +231,9 @@ def load_stocks() -> list:
 
     if os.path.exists(external_config):
         try:
-            with open(external_config, 'r', encoding='utf-8') as f:
-                stocks = json.load(f)
+            with open(external_config, 'rb') as f:
+                raw = f.read()
+            stocks = orjson.loads(raw) if orjson is not None else json.loads(raw)
             print(f"[INFO] 读取外部配置文件: {external_config}")
             logger.info(f"Loaded external stocks from: {external_config}")
         except Exception as e:
@@ -168,35 +248,43 @@ def load_stocks() -> list:
     return stocks
 
 
+@cached('ttm_fast', ttl=86400)
+def _fetch_ttm_dividend_xq(symbol: str) -> dict:
+    """雪球TTM股息（纯网络部分，成功结果进磁盘缓存）"""
+    # 雪球接口直接使用原始代码
+    df = ak.stock_individual_spot_xq(symbol=symbol)
+
+    # 查找TTM股息和股息率，直接zip两列遍历（省一个中间字典），
+    # 两个字段都拿到就提前结束，不必扫完雪球返回的几十个指标
+    ttm_dividend = 0
+    ttm_yield = 0
+    found_dividend = False
+    found_yield = False
+
+    for item, value in zip(df['item'], df['value']):
+        if not found_dividend and '股息(TTM)' in item:
+            ttm_dividend = float(value) if value else 0
+            found_dividend = True
+        elif not found_yield and '股息率(TTM)' in item:
+            ttm_yield = float(value) if value else 0
+            found_yield = True
+        if found_dividend and found_yield:
+            break
+
+    return {
+        'ttm_dividend': round(ttm_dividend, 4),
+        'ttm_yield': round(ttm_yield, 4),
+        'source': 'Xueqiu(stock_individual_spot_xq)'
+    }
+
+
 def get_ttm_dividend_xq(symbol: str) -> dict:
     """
     从雪球接口获取TTM股息数据
-    使用akshare的stock_individual_spot_xq接口
+    使用akshare的stock_individual_spot_xq接口（失败结果不进缓存）
     """
     try:
-        import akshare as ak
-        
-        # 雪球接口直接使用原始代码
-        df = ak.stock_individual_spot_xq(symbol=symbol)
-        
-        # 转换为字典
-        data = dict(zip(df['item'], df['value']))
-        
-        # 查找TTM股息和股息率
-        ttm_dividend = 0
-        ttm_yield = 0
-        
-        for item, value in data.items():
-            if '股息(TTM)' in item:
-                ttm_dividend = float(value) if value else 0
-            elif '股息率(TTM)' in item:
-                ttm_yield = float(value) if value else 0
-        
-        return {
-            'ttm_dividend': round(ttm_dividend, 4),
-            'ttm_yield': round(ttm_yield, 4),
-            'source': 'Xueqiu(stock_individual_spot_xq)'
-        }
+        return _fetch_ttm_dividend_xq(symbol)
     except Exception as e:
         print(f"    [TTM-Dividend] Error: {e}")
         return {
@@ -206,50 +294,25 @@ def get_ttm_dividend_xq(symbol: str) -> dict:
         }
 
 
-def load_stocks() -> list:
-    """
-    加载股票列表
-    优先级：
-    1. 外部配置文件 stocks.json (exe同级目录)
-    2. 内置 config.py
-    """
-    external_config = "stocks.json"
-    stocks = None
-
-    if os.path.exists(external_config):
-        try:
-            with open(external_config, 'r', encoding='utf-8') as f:
-                stocks = json.load(f)
-            print(f"[INFO] 读取外部配置文件: {external_config}")
-            logger.info(f"Loaded external stocks from: {external_config}")
-        except Exception as e:
-            print(f"[WARN] 读取外部配置文件失败: {e}")
-            logger.warning(f"Failed to load external config: {e}")
-
-    if stocks is None:
-        from config import STOCKS
-        stocks = STOCKS
-        print("[INFO] 使用内置股票配置")
-
-    return stocks
-
-
-def get_custom_roe(symbol: str) -> float:
-    """
-    获取自定义ROE配置
-    返回: 自定义ROE值(百分比)，如果未配置则返回None
-    """
-    try:
-        from config import CUSTOM_ROE
-        return CUSTOM_ROE.get(symbol)
-    except:
-        return None
+def fetch_stock_bundle(symbol: str) -> tuple:
+    """并发抓取单只股票的价格/财务/TTM股息三路数据（互不依赖）"""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as pool:
+        price_future = pool.submit(get_stock_data_tencent, symbol)
+        fin_future = pool.submit(get_financial_data_akshare, symbol)
+        ttm_future = pool.submit(get_ttm_dividend_xq, symbol)
+        return price_future.result(), fin_future.result(), ttm_future.result()
 
 
 def run_roi_analysis():
     """运行ROI分析程序"""
     STOCKS = load_stocks()
-    
+
+    # 外部stocks.json可能是空列表，线程池max_workers不能为0
+    if not STOCKS:
+        print("[WARN] 股票列表为空，无可分析标的")
+        logger.warning("Stock list is empty, nothing to analyze")
+        return
+
     logger.info("=" * 60)
     logger.info("ROI Calculator (Fast Version) Started")
     logger.info(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -273,19 +336,22 @@ def run_roi_analysis():
     calculator = ROICalculator()
     results = []
     
-    for stock in STOCKS:
+    # 所有股票的网络抓取并发执行：串行N×3次往返变成一批并行请求
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(STOCKS))) as pool:
+        bundles = list(pool.map(fetch_stock_bundle,
+                                [s['symbol'] for s in STOCKS]))
+
+    for stock, (data, fin_data, ttm_data) in zip(STOCKS, bundles):
         name = stock['name']
         symbol = stock['symbol']
         print(f"Processing {name} ({symbol})...", end=" ", flush=True)
-        
+
         try:
             # 价格
-            data = get_stock_data_tencent(symbol)
             price = data['price'] if data else 0
             logger.info(f"[{name}] Price: {price}")
-            
+
             # 财务数据
-            fin_data = get_financial_data_akshare(symbol)
             roe = fin_data['roe'] if fin_data else 0
             # bps = fin_data['bps'] if fin_data else 0  # 保留BPS备用（已注释）
             # pb = round(price / bps, 2) if price > 0 and bps > 0 else 0  # 原计算方式（已注释）
@@ -293,7 +359,6 @@ def run_roi_analysis():
             logger.info(f"[{name}] ROE: {roe}%, PB: {pb}")
             
             # TTM股息数据(使用雪球接口)
-            ttm_data = get_ttm_dividend_xq(symbol)
             ttm_dividend = ttm_data['ttm_dividend']
             ttm_yield = ttm_data['ttm_yield']
             logger.info(f"[{name}] TTM-Dividend(from Xueqiu): {ttm_dividend}, Yield: {ttm_yield}%")
@@ -397,45 +462,36 @@ def save_to_excel(results, output_dir, timestamp=""):
     """保存结果到Excel（使用时间戳命名，直接保存在data目录）"""
     try:
         from openpyxl import Workbook
-        
+
         # 使用时间戳命名文件，直接保存在data目录
         if timestamp:
             excel_path = os.path.join(output_dir, f"roi_{timestamp}.xlsx")
-            chart_path = os.path.join(output_dir, f"roi_{timestamp}.png")
         else:
             excel_path = os.path.join(output_dir, "roi_analysis.xlsx")
-            chart_path = os.path.join(output_dir, "roi_analysis.png")
-        
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "ROI Analysis"
-        
-        headers = ["Name", "Code", "Price", "ROE(%)", "PB", "LTM Dividend", "Yield(%)", "ROE/PB(%)", "Data Source"]
-        
-        for col, header in enumerate(headers, 1):
-            ws.cell(row=1, column=col, value=header)
-        
-        for row_idx, r in enumerate(results, 2):
-            ws.cell(row=row_idx, column=1, value=r.stock_name)
-            ws.cell(row=row_idx, column=2, value=r.symbol)
-            ws.cell(row=row_idx, column=3, value=round(r.current_price, 2) if r.current_price else "N/A")
-            ws.cell(row=row_idx, column=4, value=round(r.roe, 2) if r.roe else "N/A")
-            ws.cell(row=row_idx, column=5, value=round(r.pb, 2) if r.pb else "N/A")
-            ws.cell(row=row_idx, column=6, value=round(r.dividend_per_share, 4) if r.dividend_per_share else "N/A")
-            ws.cell(row=row_idx, column=7, value=f"{r.roi_formula1:.2f}%" if r.roi_formula1 else "N/A")
-            ws.cell(row=row_idx, column=8, value=f"{r.roi_formula2:.2f}%" if r.roi_formula2 else "N/A")
-            ws.cell(row=row_idx, column=9, value=r.dividend_source)
-        
-        ws.column_dimensions['A'].width = 12
-        ws.column_dimensions['B'].width = 10
-        ws.column_dimensions['C'].width = 10
-        ws.column_dimensions['D'].width = 8
-        ws.column_dimensions['E'].width = 8
-        ws.column_dimensions['F'].width = 14
-        ws.column_dimensions['G'].width = 12
-        ws.column_dimensions['H'].width = 12
-        ws.column_dimensions['I'].width = 30
-        
+
+        # write_only模式：行流式写入磁盘，不在内存里保留整棵单元格树
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("ROI Analysis")
+
+        # write_only模式下列宽必须在写入行之前设置
+        for col, width in zip('ABCDEFGHI', (12, 10, 10, 8, 8, 14, 12, 12, 30)):
+            ws.column_dimensions[col].width = width
+
+        ws.append(["Name", "Code", "Price", "ROE(%)", "PB", "LTM Dividend", "Yield(%)", "ROE/PB(%)", "Data Source"])
+
+        for r in results:
+            ws.append([
+                r.stock_name,
+                r.symbol,
+                round(r.current_price, 2) if r.current_price else "N/A",
+                round(r.roe, 2) if r.roe else "N/A",
+                round(r.pb, 2) if r.pb else "N/A",
+                round(r.dividend_per_share, 4) if r.dividend_per_share else "N/A",
+                f"{r.roi_formula1:.2f}%" if r.roi_formula1 else "N/A",
+                f"{r.roi_formula2:.2f}%" if r.roi_formula2 else "N/A",
+                r.dividend_source,
+            ])
+
         wb.save(excel_path)
         print(f"\nExcel saved: {excel_path}")
         
@@ -446,6 +502,18 @@ def save_to_excel(results, output_dir, timestamp=""):
         print(f"\nExcel error: {e}")
 
 
+def _annotated_bar(ax, names, values, title, ylabel, fmt, colors, offset, scale_ylim=False):
+    """画一组带数值标注的柱状图（save_chart的10个子图共用这一份逻辑）"""
+    bars = ax.bar(names, values, color=colors[:len(names)])
+    ax.set_title(title, fontsize=12, fontweight='bold')
+    ax.set_ylabel(ylabel)
+    if scale_ylim:
+        ax.set_ylim(0, max(values) * 1.3 if values else 10)
+    for bar, val in zip(bars, values):
+        ax.text(bar.get_x() + bar.get_width() / 2, bar.get_height() + offset,
+                fmt.format(val), ha='center', va='bottom')
+
+
 def save_chart(results, output_dir, timestamp=""):
     """保存分析图表（生成3张PNG图片）
     - chart1: 口径1 (股息率) + ROE + Price + 分红详情
@@ -453,131 +521,58 @@ def save_chart(results, output_dir, timestamp=""):
     - chart3: 口径1 + 口径2 汇总对比
     """
     try:
-        import matplotlib
-        matplotlib.use('Agg')
-        import matplotlib.pyplot as plt
-        
-        plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans']
-        plt.rcParams['axes.unicode_minus'] = False
-        
-        names = [r.stock_name for r in results]
-        f1_values = [r.roi_formula1 if r.roi_formula1 else 0 for r in results]
-        f2_values = [r.roi_formula2 if r.roi_formula2 else 0 for r in results]
-        roes = [r.roe if r.roe else 0 for r in results]
-        prices = [r.current_price if r.current_price else 0 for r in results]
-        ltm_divs = [r.dividend_per_share if r.dividend_per_share else 0 for r in results]
+        # 一次遍历抽出全部列，代替逐列的7次列表推导
+        names, f1_values, f2_values, roes, prices, ltm_divs, pbs = map(list, zip(*(
+            (r.stock_name,
+             r.roi_formula1 or 0,
+             r.roi_formula2 or 0,
+             r.roe or 0,
+             r.current_price or 0,
+             r.dividend_per_share or 0,
+             r.pb or 0)
+            for r in results)))
         
         colors = ['#4472C4', '#ED7D31', '#70AD47', '#FFC000']
-        
+        stamp = datetime.now().strftime("%Y-%m-%d %H:%M")
+
         # ========== Chart 1: 口径1 (股息率) Analysis ==========
-        fig1, axes1 = plt.subplots(2, 2, figsize=(12, 10))
-        fig1.suptitle(f'Analysis -口径1(股息率)- {datetime.now().strftime("%Y-%m-%d %H:%M")}', fontsize=14, fontweight='bold')
-        
-        # 口径1 (股息率)
-        ax1 = axes1[0, 0]
-        bars1 = ax1.bar(names, f1_values, color=colors[:len(names)])
-        ax1.set_title('ROI-KouJing1: Dividend Yield (%)', fontsize=12, fontweight='bold')
-        ax1.set_ylabel('Yield (%)')
-        ax1.set_ylim(0, max(f1_values) * 1.3 if f1_values else 10)
-        for bar, val in zip(bars1, f1_values):
-            ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, f'{val:.2f}%', ha='center', va='bottom')
-        
-        # ROE
-        ax2 = axes1[0, 1]
-        bars2 = ax2.bar(names, roes, color=colors[:len(names)])
-        ax2.set_title('ROE (%)', fontsize=12, fontweight='bold')
-        ax2.set_ylabel('ROE (%)')
-        for bar, val in zip(bars2, roes):
-            ax2.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.5, f'{val:.2f}%', ha='center', va='bottom')
-        
-        # Price
-        ax3 = axes1[1, 0]
-        bars3 = ax3.bar(names, prices, color=colors[:len(names)])
-        ax3.set_title('Price (yuan)', fontsize=12, fontweight='bold')
-        ax3.set_ylabel('Price (yuan)')
-        for bar, val in zip(bars3, prices):
-            ax3.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 5, f'{val:.2f}', ha='center', va='bottom')
-        
-        # LTM Dividend
-        ax4 = axes1[1, 1]
-        bars4 = ax4.bar(names, ltm_divs, color=colors[:len(names)])
-        ax4.set_title('LTM Dividend (yuan)', fontsize=12, fontweight='bold')
-        ax4.set_ylabel('Dividend (yuan)')
-        for bar, val in zip(bars4, ltm_divs):
-            ax4.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, f'{val:.4f}', ha='center', va='bottom')
-        
+        fig, axes = plt.subplots(2, 2, figsize=(12, 10))
+        fig.suptitle(f'Analysis -口径1(股息率)- {stamp}', fontsize=14, fontweight='bold')
+
+        _annotated_bar(axes[0, 0], names, f1_values, 'ROI-KouJing1: Dividend Yield (%)', 'Yield (%)', '{:.2f}%', colors, 0.1, scale_ylim=True)
+        _annotated_bar(axes[0, 1], names, roes, 'ROE (%)', 'ROE (%)', '{:.2f}%', colors, 0.5)
+        _annotated_bar(axes[1, 0], names, prices, 'Price (yuan)', 'Price (yuan)', '{:.2f}', colors, 5)
+        _annotated_bar(axes[1, 1], names, ltm_divs, 'LTM Dividend (yuan)', 'Dividend (yuan)', '{:.4f}', colors, 0.1)
+
         plt.tight_layout()
         chart1_path = os.path.join(output_dir, f"ROI_1_{timestamp}.png")
-        fig1.savefig(chart1_path, dpi=150, bbox_inches='tight')
+        fig.savefig(chart1_path, dpi=150, bbox_inches='tight')
         print(f"Chart 1 saved: {chart1_path}")
-        plt.close(fig1)
-        
+
         # ========== Chart 2: 口径2 (ROE/PB) Analysis ==========
-        fig2, axes2 = plt.subplots(2, 2, figsize=(12, 10))
-        fig2.suptitle(f'Analysis -口径2(ROE_PB)- {datetime.now().strftime("%Y-%m-%d %H:%M")}', fontsize=14, fontweight='bold')
-        
-        # 口径2 (ROE/PB)
-        ax1 = axes2[0, 0]
-        bars1 = ax1.bar(names, f2_values, color=colors[:len(names)])
-        ax1.set_title('ROI-KouJing2: ROE/PB (%)', fontsize=12, fontweight='bold')
-        ax1.set_ylabel('ROE/PB (%)')
-        ax1.set_ylim(0, max(f2_values) * 1.3 if f2_values else 10)
-        for bar, val in zip(bars1, f2_values):
-            ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, f'{val:.2f}%', ha='center', va='bottom')
-        
-        # ROE
-        ax2 = axes2[0, 1]
-        bars2 = ax2.bar(names, roes, color=colors[:len(names)])
-        ax2.set_title('ROE (%)', fontsize=12, fontweight='bold')
-        ax2.set_ylabel('ROE (%)')
-        for bar, val in zip(bars2, roes):
-            ax2.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.5, f'{val:.2f}%', ha='center', va='bottom')
-        
-        # Price
-        ax3 = axes2[1, 0]
-        bars3 = ax3.bar(names, prices, color=colors[:len(names)])
-        ax3.set_title('Price (yuan)', fontsize=12, fontweight='bold')
-        ax3.set_ylabel('Price (yuan)')
-        for bar, val in zip(bars3, prices):
-            ax3.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 5, f'{val:.2f}', ha='center', va='bottom')
-        
-        # PB
-        ax4 = axes2[1, 1]
-        pbs = [r.pb if r.pb else 0 for r in results]
-        bars4 = ax4.bar(names, pbs, color=colors[:len(names)])
-        ax4.set_title('PB Ratio', fontsize=12, fontweight='bold')
-        ax4.set_ylabel('PB')
-        for bar, val in zip(bars4, pbs):
-            ax4.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, f'{val:.2f}', ha='center', va='bottom')
-        
+        # 复用同一张2x2画布，清空子图即可，省一次figure创建/销毁
+        for ax in axes.flat:
+            ax.clear()
+        fig.suptitle(f'Analysis -口径2(ROE_PB)- {stamp}', fontsize=14, fontweight='bold')
+
+        _annotated_bar(axes[0, 0], names, f2_values, 'ROI-KouJing2: ROE/PB (%)', 'ROE/PB (%)', '{:.2f}%', colors, 0.1, scale_ylim=True)
+        _annotated_bar(axes[0, 1], names, roes, 'ROE (%)', 'ROE (%)', '{:.2f}%', colors, 0.5)
+        _annotated_bar(axes[1, 0], names, prices, 'Price (yuan)', 'Price (yuan)', '{:.2f}', colors, 5)
+        _annotated_bar(axes[1, 1], names, pbs, 'PB Ratio', 'PB', '{:.2f}', colors, 0.1)
+
         plt.tight_layout()
         chart2_path = os.path.join(output_dir, f"ROI_2_{timestamp}.png")
-        fig2.savefig(chart2_path, dpi=150, bbox_inches='tight')
+        fig.savefig(chart2_path, dpi=150, bbox_inches='tight')
         print(f"Chart 2 saved: {chart2_path}")
-        plt.close(fig2)
-        
+        plt.close(fig)
+
         # ========== Chart 3: 口径1 + 口径2 Combined ==========
         fig3, axes3 = plt.subplots(1, 2, figsize=(14, 6))
-        fig3.suptitle(f'ROI Combined -口径1+口径2- {datetime.now().strftime("%Y-%m-%d %H:%M")}', fontsize=14, fontweight='bold')
-        
-        # 口径1 comparison
-        ax1 = axes3[0]
-        bars1 = ax1.bar(names, f1_values, color=colors[:len(names)], label='KouJing1')
-        ax1.set_title('ROI-KouJing1: Dividend Yield (%)', fontsize=12, fontweight='bold')
-        ax1.set_ylabel('Yield (%)')
-        ax1.set_ylim(0, max(f1_values) * 1.3 if f1_values else 10)
-        for bar, val in zip(bars1, f1_values):
-            ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, f'{val:.2f}%', ha='center', va='bottom')
-        
-        # 口径2 comparison
-        ax2 = axes3[1]
-        bars2 = ax2.bar(names, f2_values, color=colors[:len(names)], label='KouJing2')
-        ax2.set_title('ROI-KouJing2: ROE/PB (%)', fontsize=12, fontweight='bold')
-        ax2.set_ylabel('ROE/PB (%)')
-        ax2.set_ylim(0, max(f2_values) * 1.3 if f2_values else 10)
-        for bar, val in zip(bars2, f2_values):
-            ax2.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, f'{val:.2f}%', ha='center', va='bottom')
-        
+        fig3.suptitle(f'ROI Combined -口径1+口径2- {stamp}', fontsize=14, fontweight='bold')
+
+        _annotated_bar(axes3[0], names, f1_values, 'ROI-KouJing1: Dividend Yield (%)', 'Yield (%)', '{:.2f}%', colors, 0.1, scale_ylim=True)
+        _annotated_bar(axes3[1], names, f2_values, 'ROI-KouJing2: ROE/PB (%)', 'ROE/PB (%)', '{:.2f}%', colors, 0.1, scale_ylim=True)
+
         plt.tight_layout()
         chart3_path = os.path.join(output_dir, f"ROI_{timestamp}.png")
         fig3.savefig(chart3_path, dpi=150, bbox_inches='tight')
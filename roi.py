@@ -4,6 +4,14 @@ from typing import Dict, Any
 class ROIResult:
     """投资回报率计算结果"""
 
+    # 固定属性集：省掉每个实例的__dict__，批量计算时更省内存、属性访问更快
+    __slots__ = (
+        'stock_name', 'symbol', 'current_price', 'dividend_per_share',
+        'roe', 'pb', 'roi_formula1', 'roi_formula2',
+        'data_source', 'dividend_source', 'pb_source',
+        'interim_dividend', 'annual_dividend', 'guaranteed_note',
+    )
+
     def __init__(self, stock_name: str, symbol: str, current_price: float,
                  dividend_per_share: float, roe: float, pb: float,
                  roi_formula1: float, roi_formula2: float):